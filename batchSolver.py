@@ -0,0 +1,74 @@
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ortools.sat.python import cp_model
+
+from buildingSpec import loadSpec
+from generatorLogic import buildFloor
+from solverConfig import addSolverArguments, getSolverArguments, getSolverConfig, solveModel
+from specAnalysis import InfeasibleSpecError
+
+SPEC_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+# Solves a single spec file, runs inside a worker process (one CP-SAT model per worker).
+# solverOverrides (see solverConfig.configureSolver) take precedence over the solver section of the spec
+def solveSpecFile(path, solverOverrides=None):
+    result = {"spec": path}
+    start = time.time()
+    try:
+        spec = loadSpec(path)
+        model = cp_model.CpModel()
+        buildFloor(model, spec)
+        result["buildTime"] = time.time() - start
+
+        solver, solveResult = solveModel(model, getSolverConfig(spec, **(solverOverrides or {})))
+        result.update(solveResult)
+        result["solveTime"] = solveResult["wallTime"]
+    except InfeasibleSpecError as e:
+        result["status"] = "REJECTED"
+        result["error"] = str(e)
+    except Exception as e:
+        result["status"] = "ERROR"
+        result["error"] = repr(e)
+    result["wallTime"] = time.time() - start
+    return result
+
+
+def findSpecs(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SPEC_EXTENSIONS))
+
+
+# Solves every spec of the directory across a process pool, results are yielded as soon as a spec is done
+def solveBatch(directory, workers=None, solverOverrides=None):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(solveSpecFile, path, solverOverrides) for path in findSpecs(directory)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a directory of building specs in parallel")
+    parser.add_argument("directory", help="directory holding the json/yaml building specs")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: cpu count)")
+    parser.add_argument("--output", help="file the json results are written to")
+    addSolverArguments(parser)
+    args = parser.parse_args()
+
+    results = []
+    print(f'{"spec":<40}{"status":<12}{"objective":>12}{"wall time(s)":>14}')
+    for result in solveBatch(args.directory, args.processes, getSolverArguments(args)):
+        results.append(result)
+        print(f'{os.path.basename(result["spec"]):<40}{result["status"]:<12}'
+              f'{str(result.get("objective", "")):>12}{result["wallTime"]:>14.3f}')
+        if "error" in result:
+            print(f'    {result["error"]}')
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(sorted(results, key=lambda result: result["spec"]), file, indent=2)
@@ -0,0 +1,191 @@
+from __future__ import print_function
+
+import argparse
+import json
+import subprocess
+import time
+
+from ortools.sat.python import cp_model
+
+from buildingSpec import validateSpec
+from generatorLogic import buildFloor
+from solverConfig import addSolverArguments, getSolverArguments, getSolverConfig, solveModel
+from specAnalysis import InfeasibleSpecError
+
+# Benchmark suite of synthetic building specs, to judge changes to the model (constraints.py, roomUtility.py, ...)
+# against each other. Every case records the build time, the model size, the time to the first layout, the final
+# objective and the status, one json line per case, so the results of two branches can be compared:
+#   python benchmark.py --output master.jsonl
+#   python benchmark.py --output branch.jsonl
+#   python benchmark.py --compare master.jsonl branch.jsonl
+
+# The rooms of a generated apartment are taken in this order: (type, min area, min height, min width)
+ROOM_PROGRAM = [("LR", 4, 2, 2), ("K", 2, 1, 1), ("BD", 4, 2, 2), ("MSB", 2, 1, 1), ("BD", 3, 1, 1), ("DN", 2, 1, 1),
+                ("BD", 3, 1, 1), ("MSB", 2, 1, 1)]
+
+# (name, width, length, apartments, rooms per apartment, flags)
+CASES = [
+    ("one apartment", 6, 6, 1, 4, {}),
+    ("one apartment golden", 8, 10, 1, 4, {"goldenRatio": True}),
+    ("two apartments", 8, 10, 2, 4, {}),
+    ("two apartments open area", 8, 10, 2, 4, {"openArea": True}),
+    ("two apartments symmetric", 8, 10, 2, 4, {"symmetric": True}),
+    ("two apartments elevator", 8, 10, 2, 4, {"equalElevatorDistance": True}),
+    ("two large apartments", 10, 12, 2, 6, {}),
+    ("four apartments", 12, 12, 4, 4, {}),
+    ("four apartments all flags", 16, 16, 4, 4,
+     {"symmetric": True, "equalElevatorDistance": True, "goldenRatio": True, "openArea": True}),
+]
+
+
+# Returns a validated spec of apartments with identical programs, flags turns on symmetric (pairs of consecutive
+# apartments), equalElevatorDistance, goldenRatio (living rooms) and openArea (top and bottom walls are open: on an
+# even length the mirror of symmetric pairs sends a room on the left wall off the grid)
+def generateSpec(width, length, apartments, roomsPerApartment, symmetric=False, equalElevatorDistance=False,
+                 goldenRatio=False, openArea=False, options=None):
+    spec = {
+        "width": width,
+        "length": length,
+        "openWalls": {"top": True, "bottom": True},
+        "allApartmentsOnOpenArea": openArea,
+        "allEqualDistanceToElevator": equalElevatorDistance,
+        "symmetricApartments": symmetric,
+        "sameTypePairs": [[apt, apt + 1] for apt in range(0, apartments - 1, 2)] if symmetric else [],
+        "apartments": [],
+        "distanceLessThan": [],
+        "options": options or {},
+    }
+    for apt in range(apartments):
+        rooms = []
+        for roomIdx in range(roomsPerApartment):
+            type, minArea, minHeight, minWidth = ROOM_PROGRAM[roomIdx % len(ROOM_PROGRAM)]
+            code = f'{type}_AP{apt + 1}'
+            if any(room["code"] == code for room in rooms):
+                code += f'_{roomIdx}'
+            rooms.append({"code": code, "minArea": minArea, "minHeight": minHeight, "minWidth": minWidth,
+                          "goldenRatio": goldenRatio and type == "LR"})
+        spec["apartments"].append(rooms)
+        # keep the first bedroom close to the living room
+        spec["distanceLessThan"].append({"apartment": apt, "rooms": [0, 2], "distance": 3})
+    return validateSpec(spec)
+
+
+class FirstSolutionTimer(cp_model.CpSolverSolutionCallback):
+    """Records when the first and the last solutions are found."""
+
+    def __init__(self):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.firstSolutionTime = None
+        self.lastSolutionTime = None
+        self.solutionCount = 0
+
+    def on_solution_callback(self):
+        self.solutionCount += 1
+        if self.firstSolutionTime is None:
+            self.firstSolutionTime = self.WallTime()
+        self.lastSolutionTime = self.WallTime()
+
+
+def getRevision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Builds and solves a spec, returns the measures of the run
+def runCase(spec, solverConfig):
+    result = {}
+    model = cp_model.CpModel()
+    start = time.time()
+    try:
+        buildFloor(model, spec)
+    except InfeasibleSpecError as e:
+        result["status"] = "REJECTED"
+        result["error"] = str(e)
+        return result
+    result["buildTime"] = time.time() - start
+    result["variables"] = len(model.Proto().variables)
+    result["constraints"] = len(model.Proto().constraints)
+
+    timer = FirstSolutionTimer()
+    solver, solveResult = solveModel(model, solverConfig, timer)
+    result["status"] = solveResult["status"]
+    result["firstSolutionTime"] = timer.firstSolutionTime
+    result["lastSolutionTime"] = timer.lastSolutionTime
+    result["solutions"] = timer.solutionCount
+    result["solveTime"] = solveResult["wallTime"]
+    result["objective"] = solveResult.get("objective")
+    result["bestBound"] = solveResult.get("bestBound")
+    return result
+
+
+def runBenchmark(cases, solverConfig, label=None, options=None):
+    for name, width, length, apartments, roomsPerApartment, flags in cases:
+        spec = generateSpec(width, length, apartments, roomsPerApartment, options=options, **flags)
+        result = {"case": name, "label": label, "width": width, "length": length, "apartments": apartments,
+                  "roomsPerApartment": roomsPerApartment, "flags": flags, "options": spec["options"],
+                  "solver": solverConfig}
+        result.update(runCase(spec, solverConfig))
+        yield result
+
+
+def loadResults(path):
+    with open(path) as file:
+        return {result["case"]: result for result in map(json.loads, filter(str.strip, file))}
+
+
+def formatValue(value):
+    if value is None:
+        return "-"
+    return f'{value:.3f}' if isinstance(value, float) else str(value)
+
+
+# Prints the measures of two result files side by side, case by case
+def compareResults(basePath, otherPath):
+    base, other = loadResults(basePath), loadResults(otherPath)
+    print(f'{"case":<28}{"measure":<20}{"base":>12}{"other":>12}{"ratio":>8}')
+    for case in base:
+        if case not in other:
+            continue
+        for measure in ["status", "buildTime", "variables", "constraints", "firstSolutionTime", "solveTime",
+                        "objective"]:
+            a, b = base[case].get(measure), other[case].get(measure)
+            ratio = f'{b / a:.2f}' if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a else ""
+            print(f'{case:<28}{measure:<20}{formatValue(a):>12}{formatValue(b):>12}{ratio:>8}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the floor model on synthetic building specs")
+    parser.add_argument("--cases", nargs="*", help="names of the cases to run (default: all)")
+    parser.add_argument("--output", help="json lines file the results are appended to")
+    parser.add_argument("--label", default=None, help="label of the results (default: the git revision)")
+    parser.add_argument("--options", default="{}", help="json model options of the generated specs, "
+                                                         "e.g. '{\"placement\": \"intervals\"}'")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "OTHER"), help="compare two result files and exit")
+    addSolverArguments(parser)
+    args = parser.parse_args()
+
+    if args.compare:
+        compareResults(*args.compare)
+        raise SystemExit(0)
+
+    solverConfig = getSolverConfig({}, **getSolverArguments(args))
+    solverConfig.setdefault("timeLimit", 30)
+    cases = [case for case in CASES if not args.cases or case[0] in args.cases]
+    label = args.label or getRevision()
+
+    output = open(args.output, "a") if args.output else None
+    print(f'{"case":<28}{"status":<10}{"build(s)":>10}{"vars":>9}{"cons":>9}{"first(s)":>10}{"solve(s)":>10}'
+          f'{"objective":>11}')
+    for result in runBenchmark(cases, solverConfig, label, json.loads(args.options)):
+        print(f'{result["case"]:<28}{result["status"]:<10}{formatValue(result.get("buildTime")):>10}'
+              f'{formatValue(result.get("variables")):>9}{formatValue(result.get("constraints")):>9}'
+              f'{formatValue(result.get("firstSolutionTime")):>10}{formatValue(result.get("solveTime")):>10}'
+              f'{formatValue(result.get("objective")):>11}')
+        if output:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    if output:
+        output.close()
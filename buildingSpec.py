@@ -0,0 +1,158 @@
+import json
+
+# A building spec captures everything generatorLogic.py used to ask for, so a floor can be solved from a file.
+# Apartment, room and pair ids are 0 indexed in a spec (the prompts are 1 indexed).
+# {
+#   "width": 8,                                     \\ rows of the building
+#   "length": 8,                                    \\ cols of the building
+#   "openWalls": {"left": true, "right": false, "top": false, "bottom": false},
+#   "allApartmentsOnOpenArea": false,
+#   "allEqualDistanceToElevator": false,
+#   "symmetricApartments": false,
+#   "sameTypePairs": [[0, 1]],
+#   "apartments": [
+#       [{"code": "LR_AP1", "minArea": 4, "minHeight": 2, "minWidth": 2, "goldenRatio": false}, ...],
+#       ...
+#   ],
+#   "distanceLessThan": [{"apartment": 0, "rooms": [0, 1], "distance": 3}],
+#   "distanceGreaterThan": [],
+#   "options": {"placement": "cells", "connectivity": "floyd", "doubledDistances": false, "dimensionTable": false,
+#               "symmetryBreaking": true},
+#   "solver": {"preset": "fastFirstLayout", "workers": 8, "timeLimit": 60}   \\ see solverConfig.py
+# }
+
+DEFAULT_OPTIONS = {
+    "placement": "cells",  # cells / intervals
+    "connectivity": "floyd",  # floyd / flow / tree
+    "doubledDistances": False,
+    "dimensionTable": False,
+    "symmetryBreaking": True,  # order interchangeable apartments and rooms (see symmetryBreaking.py)
+}
+
+WALLS = ["left", "right", "top", "bottom"]
+
+
+# Loads a building spec from a json (or yaml, if PyYAML is installed) file
+def loadSpec(path):
+    with open(path) as file:
+        if path.endswith(".yaml") or path.endswith(".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is needed to read yaml specs, install it or use a json spec")
+            spec = yaml.safe_load(file)
+        else:
+            spec = json.load(file)
+    return validateSpec(spec)
+
+
+# Fills the optional fields of the spec with their defaults and checks the ids it refers to
+def validateSpec(spec):
+    for key in ["width", "length", "apartments"]:
+        if key not in spec:
+            raise ValueError(f'Building spec is missing "{key}"')
+
+    spec.setdefault("openWalls", {})
+    for wall in WALLS:
+        spec["openWalls"][wall] = bool(spec["openWalls"].get(wall, False))
+    spec.setdefault("allApartmentsOnOpenArea", False)
+    spec.setdefault("allEqualDistanceToElevator", False)
+    spec.setdefault("symmetricApartments", False)
+    spec.setdefault("sameTypePairs", [])
+    spec.setdefault("distanceLessThan", [])
+    spec.setdefault("distanceGreaterThan", [])
+    spec["options"] = {**DEFAULT_OPTIONS, **spec.get("options", {})}
+    spec.setdefault("solver", {})
+
+    numberOfApartments = len(spec["apartments"])
+    for apt in spec["apartments"]:
+        for room in apt:
+            if "code" not in room or "minArea" not in room:
+                raise ValueError(f'Every room needs a "code" and a "minArea", got {room}')
+            room.setdefault("minHeight", 0)
+            room.setdefault("minWidth", 0)
+            room.setdefault("goldenRatio", False)
+
+    for pair in spec["sameTypePairs"]:
+        if len(pair) != 2 or not all(0 <= apt < numberOfApartments for apt in pair):
+            raise ValueError(f'Invalid same type pair {pair}')
+
+    for rule in spec["distanceLessThan"] + spec["distanceGreaterThan"]:
+        if not 0 <= rule["apartment"] < numberOfApartments:
+            raise ValueError(f'Invalid apartment in distance rule {rule}')
+        if not all(0 <= room < len(spec["apartments"][rule["apartment"]]) for room in rule["rooms"]):
+            raise ValueError(f'Invalid room in distance rule {rule}')
+
+    return spec
+
+
+# Asks for the building spec with the original prompts of generatorLogic.py
+def readSpecFromInput():
+    numberOfApartments = int(input("Enter number of apartments: "))
+    widthOfBuilding = int(input("Enter width of building(rows): "))
+    lengthOfBuilding = int(input("Enter height of building(cols): "))
+    print("You will be asked some questions answer by y/n")
+    isOpenWall = [0, 0, 0, 0]
+    for i in range(4):
+        isOpenWall[i] = "y" in input("is the wall number " + str(i + 1) + " on an open area: ")
+
+    spec = {
+        "width": widthOfBuilding,
+        "length": lengthOfBuilding,
+        "openWalls": {wall: isOpenWall[i] for i, wall in enumerate(WALLS)},
+    }
+
+    spec["allApartmentsOnOpenArea"] = "y" in input("Should all apartments have look on landscape view? ")
+    spec["allEqualDistanceToElevator"] = "y" in input(
+        "Should all apartments be of an equal distance to the elevators unit? ")
+    spec["symmetricApartments"] = "y" in input("Should apartments of same type be symmetric? ")
+
+    options = {}
+    options["placement"] = "intervals" if "y" in input(
+        "Should rooms be placed with intervals (NoOverlap2D) instead of per cell? ") else "cells"
+    options["connectivity"] = input(
+        "Which connectivity encoding should be used (floyd/flow/tree)? ").strip() or 'floyd'
+    options["doubledDistances"] = "y" in input("Should distances use doubled coordinates (no division)? ")
+    options["dimensionTable"] = "y" in input("Should room dimensions be restricted with precomputed tables? ")
+    spec["options"] = options
+
+    spec["sameTypePairs"] = []
+    numberOfPairs = int(input("Please enter number of same type apartment pairs: "))
+    for i in range(numberOfPairs):
+        print("Pair number " + str(i + 1))
+        x = int(input("Please enter id (1 indexed) of first apartment in the pair: ")) - 1
+        y = int(input("Please enter id (1 indexed) of second apartment in the pair: ")) - 1
+        spec["sameTypePairs"].append([x, y])
+
+    spec["apartments"] = []
+    for i in range(numberOfApartments):
+        numberOfRooms = int(input("Please enter the number of rooms of apartment number " + str(i + 1) + ": "))
+        curRooms = []
+        for j in range(numberOfRooms):
+            curRoom = {}
+            curRoom["code"] = input("Please enter room code for room number " + str(j + 1) + ":")
+            curRoom["minArea"] = int(input("Please enter minimum area for room number " + str(j + 1) + ":"))
+            curRoom["minHeight"] = int(input("Please enter minimum height for room number " + str(j + 1) + ":"))
+            curRoom["minWidth"] = int(input("Please enter minimum width for room number " + str(j + 1) + ":"))
+            curRoom["goldenRatio"] = "y" in input(
+                "Should we aim to allocate spaces with ratios following the divine proportion for this room? ")
+            curRooms.append(curRoom)
+        spec["apartments"].append(curRooms)
+
+    spec["distanceLessThan"] = readDistanceRules("less than")
+    spec["distanceGreaterThan"] = readDistanceRules("greater than")
+    return validateSpec(spec)
+
+
+def readDistanceRules(kind):
+    rules = []
+    numberOfPairs = int(
+        input(f"Please enter the number of room pairs for which you want to specify distance {kind}: "))
+
+    for i in range(numberOfPairs):
+        apartmentId = int(input("please enter apartment Id (1 indexed) for the pair number " + str(i + 1) + ": ")) - 1
+        x = int(input("please enter room Id (1 indexed) for the first room: ")) - 1
+        y = int(input("please enter room Id (1 indexed) for the second room: ")) - 1
+        d = int(input("please enter the distance: "))
+        rules.append({"apartment": apartmentId, "rooms": [x, y], "distance": d})
+    return rules
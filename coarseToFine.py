@@ -0,0 +1,105 @@
+from __future__ import print_function
+
+import argparse
+import copy
+
+from ortools.sat.python import cp_model
+
+from buildingSpec import loadSpec
+from generatorLogic import addFloorHints, buildFloor, getFloorRects
+from solutionPrinter import SolutionPrinterWithLimit
+from solverConfig import addSolverArguments, getSolverArguments, getSolverConfig, solveModel
+from specAnalysis import InfeasibleSpecError
+
+# Coarse to fine solve of a floor: the spec is first solved on a grid where every coarse cell stands for
+# factor x factor cells (with scaled minimums), the room rectangles are then scaled back up and used both as hints
+# and as coordinate windows (rect +- slack) for the full resolution solve, which still posts every constraint.
+
+
+def ceilDiv(a, b):
+    return -(-a // b)
+
+
+# Returns the spec downsampled by factor
+def coarsenSpec(spec, factor):
+    coarse = copy.deepcopy(spec)
+    coarse["width"] = ceilDiv(spec["width"], factor)
+    coarse["length"] = ceilDiv(spec["length"], factor)
+    for apt in coarse["apartments"]:
+        for room in apt:
+            room["minArea"] = ceilDiv(room["minArea"], factor * factor)
+            room["minHeight"] = ceilDiv(room["minHeight"], factor)
+            room["minWidth"] = ceilDiv(room["minWidth"], factor)
+    for rule in coarse["distanceLessThan"] + coarse["distanceGreaterThan"]:
+        rule["distance"] = ceilDiv(rule["distance"], factor)
+    return coarse
+
+
+# Returns the coarse rects scaled up to the full resolution grid
+def refineRects(rects, factor, gridW, gridH):
+    return {code: (ax * factor, ay * factor, min(bx * factor + factor - 1, gridW - 1),
+                   min(by * factor + factor - 1, gridH - 1))
+            for code, (ax, ay, bx, by) in rects.items()}
+
+
+# Returns the coordinate windows (rect +- slack on every point) of the refined rects
+def getWindows(rects, slack, gridW, gridH):
+    windows = {}
+    for code, rect in rects.items():
+        windows[code] = {}
+        for point, value in zip(['ax', 'ay', 'bx', 'by'], rect):
+            mx = gridW - 1 if point.endswith('x') else gridH - 1
+            windows[code][point] = (max(0, value - slack), min(mx, value + slack))
+    return windows
+
+
+# Solves the spec coarse to fine. Returns the model, the floor, the solver and the result of the full resolution
+# solve (which falls back to hints only when the windows make it infeasible)
+def solveCoarseToFine(spec, factor=2, slack=None, solverOverrides=None):
+    if slack is None:
+        slack = factor
+    config = getSolverConfig(spec, **(solverOverrides or {}))
+
+    # corridors, ELR and SW keep at least one coarse cell, so the coarse spec can be rejected when the full
+    # resolution one is not: then the full resolution solve runs without hints
+    try:
+        coarseModel = cp_model.CpModel()
+        coarseFloor = buildFloor(coarseModel, coarsenSpec(spec, factor))
+        coarseSolver, coarseResult = solveModel(coarseModel, config)
+    except InfeasibleSpecError:
+        coarseResult = {"status": "REJECTED", "wallTime": 0}
+
+    windows = None
+    rects = {}
+    if coarseResult["status"] in ["OPTIMAL", "FEASIBLE"]:
+        rects = refineRects(getFloorRects(coarseSolver.Value, coarseFloor), factor, spec["width"], spec["length"])
+        windows = getWindows(rects, slack, spec["width"], spec["length"])
+
+    for roomWindows in ([windows, None] if windows else [None]):
+        model = cp_model.CpModel()
+        floor = buildFloor(model, spec, roomWindows)
+        addFloorHints(model, floor, rects)
+        solver, result = solveModel(model, config)
+        result["coarseStatus"] = coarseResult["status"]
+        result["coarseWallTime"] = coarseResult["wallTime"]
+        result["windowed"] = roomWindows is not None
+        if result["status"] != "INFEASIBLE":
+            break
+    return model, floor, solver, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a floor on a coarse grid first, then at full resolution")
+    parser.add_argument("spec", help="json/yaml building spec")
+    parser.add_argument("--factor", type=int, default=2, help="cells per coarse cell along each axis")
+    parser.add_argument("--slack", type=int, default=None, help="how far the fine rooms may move (default: factor)")
+    addSolverArguments(parser)
+    args = parser.parse_args()
+
+    model, floor, solver, result = solveCoarseToFine(loadSpec(args.spec), args.factor, args.slack,
+                                                     getSolverArguments(args))
+    print(f'coarse: {result["coarseStatus"]} in {result["coarseWallTime"]}s, '
+          f'fine: {result["status"]} in {result["wallTime"]}s (windowed: {result["windowed"]})')
+    if result["status"] in ["OPTIMAL", "FEASIBLE"]:
+        SolutionPrinterWithLimit(1, floor["grid"], floor["domain"], floor["apartments"] + [floor["corridors"]],
+                                 floor["objectiveTerms"]).printSolution(solver)
@@ -1,7 +1,10 @@
+from functools import lru_cache
+
+from profiling import debugPrint
 from roomUtility import *
 
 
-def roomConstraint(model, room, grid, domain):
+def roomConstraint(model, room, grid, domain, useDimensionTable=False):
     # room =
     # {
     #   'ax':, 'ay':, \\ x and y are the or tool variables representing point a
@@ -9,48 +12,165 @@ def roomConstraint(model, room, grid, domain):
     #   'val': \\ val is the val that is assigned on the grid for this room
     # }
 
-    minArea = room['minArea']
     minHeight = room['minHeight']
-    minWidth = room['minWidth']
 
     gridW = len(grid)
     gridH = len(grid[0])
 
-    for point in ['ax', 'ay', 'bx', 'by']:
-        if room[point] is None:
-            room[point] = model.NewIntVar(0, gridW - 1, room['val'] + point)
+    createRoomPoints(model, room, gridW, gridH)
 
     ax = room['ax']
     ay = room['ay']
     bx = room['bx']
     by = room['by']
-    print(minHeight)
-    print(gridH)
-    print()
-    height = model.NewIntVar(minHeight, gridH, '')
-    width = model.NewIntVar(minWidth, gridW, '')
-    area = model.NewIntVar(minArea, gridH * gridW, '')
-
-    room['area'] = area
+    debugPrint(minHeight)
+    debugPrint(gridH)
+    debugPrint()
+    width, height = roomDimensions(model, room, gridW, gridH, useDimensionTable)
     model.Add(height == by - ay + 1)
     model.Add(width == bx - ax + 1)
-    model.AddMultiplicationEquality(area, [width, height])
 
+    # matchCellToRoom looks the room up once per cell
+    domain = asDomain(domain)
+    rowIn, colIn = getRoomSpans(model, room, gridW, gridH)
     for rowIdx, row in enumerate(grid):
         for colIdx, cell in enumerate(row):
             # grid val == this room if and only if the index of this cell is inside the room
-            matchCellToRoom(ax, ay, bx, by, cell, colIdx, model, room, rowIdx, domain)
+            matchCellToRoom(rowIn[rowIdx], colIn[colIdx], cell, model, room, domain)
+
+
+# Creates the ax, ay, bx, by variables of the room (the ones that are not already set).
+# x points range over the rows and y points over the columns, and their domains are tightened from the smallest
+# dimensions the room can take (e.g. a room of at least 3 rows can not start on one of the last 2 rows).
+# room['window'] optionally restricts each point further to a (lo, hi) range, it is ignored when it does not
+# intersect the tightened domain
+def createRoomPoints(model, room, gridW, gridH):
+    bounds = getRoomBounds(room, gridW, gridH)
+    window = room.get('window') or {}
+    for point in ['ax', 'ay', 'bx', 'by']:
+        if room[point] is not None:
+            continue
+        if bounds is None:
+            # the room does not fit at all, the spec analysis reports it
+            lo, hi = 0, (gridW if point.endswith('x') else gridH) - 1
+        else:
+            lo, hi = bounds[point]
+        if point in window and max(lo, window[point][0]) <= min(hi, window[point][1]):
+            lo, hi = max(lo, window[point][0]), min(hi, window[point][1])
+        room[point] = model.NewIntVar(lo, hi, room['val'] + point)
+
+
+# Returns the (width, height, area) minimums the room can really take on the floor, taking its minArea,
+# minimum dimensions and golden ratio into account (None if the room can not fit)
+def getMinimumDimensions(room, gridW, gridH):
+    table = getDimensionTable(gridW, gridH, room['minArea'], room['minHeight'], room['minWidth'],
+                              room.get('goldenRatio', False))
+    if len(table) == 0:
+        return None
+    return min(width for width, height, area in table), min(height for width, height, area in table), \
+        min(area for width, height, area in table)
+
+
+# Returns the (lo, hi) range of each point of the room (None if the room can not fit)
+def getRoomBounds(room, gridW, gridH):
+    minimums = getMinimumDimensions(room, gridW, gridH)
+    if minimums is None:
+        return None
+    minWidth, minHeight, minArea = minimums
+    return {
+        'ax': (0, gridW - minWidth),
+        'bx': (minWidth - 1, gridW - 1),
+        'ay': (0, gridH - minHeight),
+        'by': (minHeight - 1, gridH - 1),
+    }
+
+
+# Creates the width, height and area variables of the room (area is stored in room['area']).
+# By default area = width * height is a multiplication equality and the golden ratio is left to ensureGoldenRatio.
+# With useDimensionTable the (width, height, area) triple is restricted to the precomputed table of feasible
+# dimensions, which also covers the golden ratio when room['goldenRatio'] is set
+def roomDimensions(model, room, gridW, gridH, useDimensionTable=False):
+    minArea = room['minArea']
+    minHeight = room['minHeight']
+    minWidth = room['minWidth']
+
+    minimums = getMinimumDimensions(room, gridW, gridH)
+    if minimums is not None:
+        minWidth, minHeight, minArea = minimums
+
+    height = model.NewIntVar(minHeight, gridH, '')
+    width = model.NewIntVar(minWidth, gridW, '')
+    area = model.NewIntVar(minArea, gridH * gridW, '')
+
+    room['area'] = area
+    if useDimensionTable:
+        table = getDimensionTable(gridW, gridH, room['minArea'], room['minHeight'], room['minWidth'],
+                                  room.get('goldenRatio', False))
+        model.AddAllowedAssignments([width, height, area], table)
+    else:
+        model.AddMultiplicationEquality(area, [width, height])
+    return width, height
+
+
+# Returns all the (width, height, area) triples a room can take on a gridW x gridH floor, cached so repeated builds
+# reuse them
+@lru_cache(maxsize=None)
+def getDimensionTable(gridW, gridH, minArea, minHeight, minWidth, goldenRatio=False):
+    table = []
+    for width in range(max(minWidth, 1), gridW + 1):
+        for height in range(max(minHeight, 1), gridH + 1):
+            if width * height < minArea:
+                continue
+            # same approximation as ensureGoldenRatio
+            if goldenRatio and 10 * max(width, height) != 16 * min(width, height):
+                continue
+            table.append((width, height, width * height))
+    return tuple(table)
+
+
+# Interval based alternative to roomConstraint: the room is modelled as a pair of x/y interval variables built
+# from ax/bx and ay/by, and no per cell variable is created. Overlaps between rooms are handled by
+# noOverlapConstraint, the grid is only derived when a solution is rendered
+def roomIntervalConstraint(model, room, gridW, gridH, useDimensionTable=False):
+    createRoomPoints(model, room, gridW, gridH)
+
+    width, height = roomDimensions(model, room, gridW, gridH, useDimensionTable)
+    room['xInterval'] = model.NewIntervalVar(room['ax'], width, room['bx'] + 1, room['val'] + 'x')
+    room['yInterval'] = model.NewIntervalVar(room['ay'], height, room['by'] + 1, room['val'] + 'y')
 
 
-def matchCellToRoom(ax, ay, bx, by, cell, colIdx, model, room, rowIdx, domain):
-    inRoom = isAnd(model, [isBetween(model, rowIdx, ax, bx), isBetween(model, colIdx, ay, by)])
+# Adds the constraint that no two rooms (placed with roomIntervalConstraint) overlap, and that together
+# they fit in the floor
+def noOverlapConstraint(model, rooms, gridW, gridH):
+    model.AddNoOverlap2D([room['xInterval'] for room in rooms], [room['yInterval'] for room in rooms])
+    model.Add(LinearExpr.Sum([room['area'] for room in rooms]) <= gridW * gridH)
 
-    model.Add(cell == domain.index(room['val'])).OnlyEnforceIf(inRoom)
-    model.Add(cell != domain.index(room['val'])).OnlyEnforceIf(inRoom.Not())
+
+def matchCellToRoom(rowIn, colIn, cell, model, room, domain):
+    inRoom = getCellIsValue(model, cell, domain.index(room['val']))
+
+    model.AddBoolAnd([rowIn, colIn]).OnlyEnforceIf(inRoom)
+    model.AddBoolOr([rowIn.Not(), colIn.Not()]).OnlyEnforceIf(inRoom.Not())
 
 
 # Adds a Constraint that all rooms should be connected (i.e There is a path from each room to all other rooms)
-def enforceComponencyConstraint(model, rooms):
+# method selects the encoding:
+#   'floyd': unrolled Floyd-Warshall closure, n^3 reified literals
+#   'flow': single-commodity flow from the first room on the adjacency arcs (and on the reversed arcs), n^2 vars
+#   'tree': spanning trees rooted at the first room with depth variables (out-tree and in-tree), n^2 vars
+def enforceComponencyConstraint(model, rooms, method='floyd'):
+    if method == 'flow' or method == 'tree':
+        n = len(rooms)
+        arcs = [[None if u == v else isAdjacent(model, u, v, rooms[u], rooms[v]) for v in range(n)] for u in range(n)]
+        reversedArcs = [[arcs[v][u] for v in range(n)] for u in range(n)]
+        enforce = enforceRootedFlow if method == 'flow' else enforceRootedTree
+        # a path from the root to every room and from every room to the root is a path between any two rooms
+        enforce(model, arcs)
+        enforce(model, reversedArcs)
+        return
+    if method != 'floyd':
+        raise ValueError(f'Unknown connectivity method {method}')
+
     n = len(rooms)
     path = [None for y in range(n)]
     initial = []
@@ -79,110 +199,142 @@ def enforceComponencyConstraint(model, rooms):
     model.AddBoolAnd(final)
 
 
+# Adds a Constraint that every node is reachable from node 0 using the arcs (arcs[u][v] is the literal of u -> v):
+# node 0 sends one unit of flow to every other node, flow can only go through active arcs
+def enforceRootedFlow(model, arcs):
+    n = len(arcs)
+    if n <= 1:
+        return
+    flow = [[None for v in range(n)] for u in range(n)]
+    for u in range(n):
+        for v in range(n):
+            if u == v:
+                continue
+            flow[u][v] = model.NewIntVar(0, n - 1, '')
+            model.Add(flow[u][v] == 0).OnlyEnforceIf(arcs[u][v].Not())
+
+    for v in range(n):
+        inFlow = LinearExpr.Sum([flow[u][v] for u in range(n) if u != v])
+        outFlow = LinearExpr.Sum([flow[v][u] for u in range(n) if u != v])
+        if v == 0:
+            model.Add(outFlow - inFlow == n - 1)
+        else:
+            model.Add(inFlow - outFlow == 1)
+
+
+# Adds a Constraint that every node is reachable from node 0 using the arcs (arcs[u][v] is the literal of u -> v):
+# every other node picks a parent through an active arc, and is one level deeper than its parent
+def enforceRootedTree(model, arcs):
+    n = len(arcs)
+    if n <= 1:
+        return
+    depth = [model.NewIntVar(0, n - 1, '') for v in range(n)]
+    model.Add(depth[0] == 0)
+    for v in range(1, n):
+        parents = []
+        for u in range(n):
+            if u == v:
+                continue
+            parent = model.NewBoolVar('')
+            model.AddImplication(parent, arcs[u][v])
+            model.Add(depth[v] == depth[u] + 1).OnlyEnforceIf(parent)
+            parents.append(parent)
+        model.AddExactlyOne(parents)
+
+
 def aptAdjacencyConstraint(model, apt, grid, domain):
-    nextList = filter(lambda d: "xxx" in d, domain)
+    domain = asDomain(domain)
+    nextList = domain.corridors
     boolVars = []
     for room in apt:
+        perimeter = getRoomPerimeter(model, room, len(grid), len(grid[0]))
         for nextElem in nextList:
-            upperX = model.NewIntVar(-1, len(grid), '')
-            model.Add(upperX == room['ax'] - 1)
-
-            lowerX = model.NewIntVar(-1, len(grid), '')
-            model.Add(lowerX == room['bx'] + 1)
-
-            rightY = model.NewIntVar(-1, len(grid[0]), '')
-            model.Add(rightY == room['by'] + 1)
-
-            leftY = model.NewIntVar(-1, len(grid[0]), '')
-            model.Add(leftY == room['ay'] - 1)
-
             for rowIdx, row in enumerate(grid):
                 for colIdx, cell in enumerate(row):
-                    rowIsLower = isEqual(model, rowIdx, lowerX)
-                    rowIsUpper = isEqual(model, rowIdx, upperX)
-                    colIsLeft = isEqual(model, colIdx, leftY)
-                    colIsRight = isEqual(model, colIdx, rightY)
-                    inEdge = isOr(model, [
-                        isAnd(model,
-                              [isOr(model, [rowIsLower, rowIsUpper]), isBetween(model, colIdx, leftY + 1, rightY - 1)]),
-                        isAnd(model,
-                              [isOr(model, [colIsLeft, colIsRight]), isBetween(model, rowIdx, upperX + 1, lowerX - 1)])
-                    ])
-
-                    isAdjRoom = isEqual(model, cell, domain.index(nextElem))
+                    inEdge = perimeter[rowIdx][colIdx]
+                    isAdjRoom = getCellIsValue(model, cell, domain.index(nextElem))
                     boolVars.append(isAnd(model, [inEdge, isAdjRoom]))
     model.AddBoolOr(boolVars)
 
 
-def roomAdjacencyConstraint(model, room, grid, domain):
-    split = room["val"].split("_")
-    type = split[0]
-    apt = split[1]
-    dict = {"DN": ["K"], "K": ["D"], "MSB": ["D"], "DR": ["BD"], "MNB": ["BD", "D"]}
-    if type not in dict: return
-
-    nextList = dict[type]
-
-    for nextElem in nextList:
-        assRoom = ""
+# Returns, for each room type the room has to be adjacent to, the list of domain values it may touch
+# (None if the room has no adjacency rule)
+def getAdjacencyTargets(room, domain):
+    targets = asDomain(domain).getAdjacencyTargets(room["val"])
+    for adjacentRooms in targets or []:
+        debugPrint(f'{room["val"]} adj to one in {adjacentRooms}')
+    return targets
 
-        if (type == "MNB"):
-            assRoom = split[2]
-            if (assRoom.startswith("#")): return
-        elif (type == "DR"):
-            assRoom = split[2]
 
-        adjacentRooms = list(filter(
-            lambda x: (
-                    (apt in x or "AP" not in x) and
-                    (nextElem == x.split("_")[0]) and
-                    (assRoom == "" or (len(x) > 1 and assRoom == x.split("_")[2]) or len(x) == 1)),
-            domain))
+def roomAdjacencyConstraint(model, room, grid, domain):
+    domain = asDomain(domain)
+    targets = getAdjacencyTargets(room, domain)
+    if targets is None: return
 
-        print(f'{room["val"]} adj to one in {adjacentRooms}')
+    perimeter = getRoomPerimeter(model, room, len(grid), len(grid[0]))
 
+    for adjacentRooms in targets:
         boolVars = []
 
-        upperX = model.NewIntVar(-1, len(grid), '')
-        model.Add(upperX == room['ax'] - 1)
-
-        lowerX = model.NewIntVar(-1, len(grid), '')
-        model.Add(lowerX == room['bx'] + 1)
-
-        rightY = model.NewIntVar(-1, len(grid[0]), '')
-        model.Add(rightY == room['by'] + 1)
-
-        leftY = model.NewIntVar(-1, len(grid[0]), '')
-        model.Add(leftY == room['ay'] - 1)
-
         for rowIdx, row in enumerate(grid):
             for colIdx, cell in enumerate(row):
-                rowIsLower = isEqual(model, rowIdx, lowerX)
-                rowIsUpper = isEqual(model, rowIdx, upperX)
-                colIsLeft = isEqual(model, colIdx, leftY)
-                colIsRight = isEqual(model, colIdx, rightY)
-                inEdge = isOr(model, [
-                    isAnd(model,
-                          [isOr(model, [rowIsLower, rowIsUpper]), isBetween(model, colIdx, leftY + 1, rightY - 1)]),
-                    isAnd(model,
-                          [isOr(model, [colIsLeft, colIsRight]), isBetween(model, rowIdx, upperX + 1, lowerX - 1)])
-                ])
-
+                inEdge = perimeter[rowIdx][colIdx]
                 for adjacentRoom in adjacentRooms:
-                    # print(domain.index(adjacentRoom))
-                    # print(type(cell))
-                    isAdjRoom = isEqual(model, cell, domain.index(adjacentRoom))
+                    isAdjRoom = getCellIsValue(model, cell, domain.index(adjacentRoom))
                     boolVars.append(isAnd(model, [inEdge, isAdjRoom]))
                     # boolVars.append((inEdge))
         model.AddBoolOr(boolVars)
 
 
-def createRoom(val, minArea, minHeight=0, minWidth=0, ax=None, ay=None, bx=None, by=None):
+# Returns a boolean variable that is true only if the room touches a cell that no room covers (the free space 'D',
+# which has no rectangle with interval placement): a 1x1 probe cell next to the room and outside of every room
+def isTouchingFreeSpace(model, room, rooms, gridW, gridH):
+    touching = model.NewBoolVar('')
+    px = model.NewIntVar(0, gridW - 1, '')
+    py = model.NewIntVar(0, gridH - 1, '')
+    probe = {'ax': px, 'ay': py, 'bx': px, 'by': py}
+    model.AddImplication(touching, isTouching(model, room, probe))
+    for other in rooms:
+        outside = [model.NewBoolVar('') for _ in range(4)]
+        model.Add(px < other['ax']).OnlyEnforceIf(outside[0])
+        model.Add(px > other['bx']).OnlyEnforceIf(outside[1])
+        model.Add(py < other['ay']).OnlyEnforceIf(outside[2])
+        model.Add(py > other['by']).OnlyEnforceIf(outside[3])
+        model.AddBoolOr(outside).OnlyEnforceIf(touching)
+    return touching
+
+
+# Interval placement version of roomAdjacencyConstraint, the room has to touch one of the allowed rooms
+# (or the free space when 'D' is allowed)
+def intervalRoomAdjacencyConstraint(model, room, rooms, domain, gridW, gridH):
+    targets = getAdjacencyTargets(room, domain)
+    if targets is None: return
+
+    roomsByVal = {other['val']: other for other in rooms}
+    for adjacentRooms in targets:
+        boolVars = [isTouching(model, room, roomsByVal[val]) for val in adjacentRooms if val in roomsByVal]
+        if 'D' in adjacentRooms:
+            boolVars.append(isTouchingFreeSpace(model, room, rooms, gridW, gridH))
+        model.AddBoolOr(boolVars)
+
+
+# Interval placement version of aptAdjacencyConstraint, one of the rooms of the apartment has to touch a corridor
+def intervalAptAdjacencyConstraint(model, apt, corridors):
+    boolVars = []
+    for room in apt:
+        for corridor in corridors:
+            if getRoomInfo(corridor['val']).isCorridor:
+                boolVars.append(isTouching(model, room, corridor))
+    model.AddBoolOr(boolVars)
+
+
+def createRoom(val, minArea, minHeight=0, minWidth=0, ax=None, ay=None, bx=None, by=None, goldenRatio=False):
     return {
         "val": val,
         "minArea": minArea,
         "minHeight": minHeight,
         "minWidth": minWidth,
+        "goldenRatio": goldenRatio,
         "ax": ax,
         "ay": ay,
         "bx": bx,
@@ -198,7 +350,7 @@ def getCountSunRooms(model, apts, grid):
     return getSum(model, boolVars, len(grid) * len(grid[0]))
 
 
-def aptOpenAreaConstraint(model, apt, onOpenArea, grid):
+def aptOpenAreaConstraint(model, apt, onOpenArea, grid, enforce=None):
     boolvars = []
     for room in apt:
         for key, value in onOpenArea.items():
@@ -207,8 +359,8 @@ def aptOpenAreaConstraint(model, apt, onOpenArea, grid):
             if key in ["bottom", "top"]:
                 boolvars.append(isOnBorder(model, 0 if key == "top" else len(grid) - 1, True, room))
             else:
-                boolvars.append(isOnBorder(model, 0 if key == "left" else len(grid[0]) - 1, True, room))
-    model.AddBoolOr(boolvars)
+                boolvars.append(isOnBorder(model, 0 if key == "left" else len(grid[0]) - 1, False, room))
+    enforceIf(model.AddBoolOr(boolvars), enforce)
 
 
 def symmetricRooms(model, rooms):
@@ -223,8 +375,9 @@ def symmetricApts(model, apts):
         symmetricRooms(model, [apt[i] for apt in apts])
 
 
-# Adds Constraint that the room follows the golden ratio (approximated ratio)
-def ensureGoldenRatio(model, room, mx):
+# Adds Constraint that the room follows the golden ratio (approximated ratio).
+# When the enforce literal is given the constraint only holds if it is true
+def ensureGoldenRatio(model, room, mx, enforce=None):
     x = model.NewIntVar(0, mx, '')
     y = model.NewIntVar(0, mx, '')
     model.Add(x == room['bx'] - room['ax'] + 1)
@@ -233,7 +386,7 @@ def ensureGoldenRatio(model, room, mx):
     c = model.NewIntVar(0, mx, '')
     model.AddMinEquality(a, [x, y])
     model.AddMaxEquality(c, [x, y])
-    model.Add(10 * c == 16 * a)
+    enforceIf(model.Add(10 * c == 16 * a), enforce)
 
 
 def getCountDistanceLessThan(model, roomTuples, max):
@@ -254,7 +407,7 @@ def getCountDistanceGreaterThan(model, roomTuples, max):
 # max is equal to the maximum possible distance between any two pair of rooms (i.e height+width of floor)
 def getPairWiseDistanceBetWeenBedroom(model, rooms, max):
     n = len(rooms)
-    max2 = n * n * max;
+    max2 = n * n * max * getDistanceScale(model)
     sum = model.NewIntVar(0, 0, '')
     for i in range(0, n):
         if isBedroom(rooms[i]):
@@ -270,7 +423,7 @@ def getPairWiseDistanceBetWeenBedroom(model, rooms, max):
 # max is equal to the maximum possible distance between any two pair of rooms (i.e height+width of floor)
 def getPairWiseDistanceToBathRoom(model, rooms, max):
     n = len(rooms)
-    max2 = n * n * max;
+    max2 = n * n * max * getDistanceScale(model)
     sum = model.NewIntVar(0, 0, '')
     for i in range(0, n):
         if isMainBathroom(rooms[i]):
@@ -291,28 +444,35 @@ def sunRoomConstraint(model, room, grid):
 
 
 # Adds a constraint that the minimum distance between all apartments and the elevator room is equal.
-def ensureEqualDistanceToElevator(model, apartments, elevatorRoom, max):
+# When the enforce literal is given the constraint only holds if it is true
+def ensureEqualDistanceToElevator(model, apartments, elevatorRoom, max, enforce=None):
     last = None
-    mxVar = model.NewIntVar(max, max, '')
+    scaledMax = max * getDistanceScale(model)
+    mxVar = model.NewIntVar(scaledMax, scaledMax, '')
     for ap in range(0, len(apartments)):
         distances = [mxVar]
         for room in apartments[ap]:
             distances.append(getDistance(model, room, elevatorRoom, max))
-        curMinDist = model.NewIntVar(0, max, '')
+        curMinDist = model.NewIntVar(0, scaledMax, '')
         model.AddMinEquality(curMinDist, distances)
         if ap == 0:
             last = curMinDist
         else:
-            model.Add(last == curMinDist)
+            enforceIf(model.Add(last == curMinDist), enforce)
 
 # Ensures that two apartments are symmetrical along the y-axis
 #(MAKE SURE THAT THE ORDER IN THE LIST IS THE SAME)
-def ensureApartmentSymmetry (model ,apartment1 , apartment2 , midX):
+# When the enforce literal is given the constraint only holds if it is true
+def ensureApartmentSymmetry (model ,apartment1 , apartment2 , midX, enforce=None):
+    # apartments with a different number of rooms can not be mirrored
+    if len(apartment1) != len(apartment2):
+        enforceIf(model.AddBoolOr([]), enforce)
+        return
     n = len(apartment1)
     for i in range(n):
         room1  = apartment1[i]
         room2  = apartment2[i]
-        model.Add(room2['ay']-midX==midX-room1['by'])
-        model.Add(midX-room1['ay']==room2['by']-midX)
-        model.Add(room2['ax']==room1['ax'])
-        model.Add(room2['bx']==room1['bx'])
+        enforceIf(model.Add(room2['ay']-midX==midX-room1['by']), enforce)
+        enforceIf(model.Add(midX-room1['ay']==room2['by']-midX), enforce)
+        enforceIf(model.Add(room2['ax']==room1['ax']), enforce)
+        enforceIf(model.Add(room2['bx']==room1['bx']), enforce)
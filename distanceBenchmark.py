@@ -0,0 +1,62 @@
+from __future__ import print_function
+
+import sys
+import time
+
+from ortools.sat.python import cp_model
+
+from constraints import *
+
+# Compares the solve time of the distance objectives of generatorLogic.py with midpoints computed by division
+# (getMid) and with doubled coordinates (useDoubledCoordinates), on the same specs.
+# Rooms are placed with intervals so that the distance terms dominate the model.
+# usage: python distanceBenchmark.py [time limit in seconds]
+
+SPECS = [
+    # (name, rows, cols, apartments, each apartment is a list of (room code, min area))
+    ("small", 8, 8, [[("BD_AP1_a", 4), ("BD_AP1_b", 4), ("MSB_AP1", 2), ("LR_AP1", 6)]]),
+    ("two apartments", 10, 10, [[("BD_AP1_a", 4), ("BD_AP1_b", 4), ("MSB_AP1", 2), ("LR_AP1", 6)],
+                                [("BD_AP2_a", 4), ("BD_AP2_b", 4), ("MSB_AP2", 2), ("LR_AP2", 6)]]),
+    ("three bedrooms", 12, 12, [[("BD_AP1_a", 6), ("BD_AP1_b", 6), ("BD_AP1_c", 6), ("MSB_AP1", 3),
+                                 ("LR_AP1", 9), ("K_AP1", 4)],
+                                [("BD_AP2_a", 6), ("BD_AP2_b", 6), ("BD_AP2_c", 6), ("MSB_AP2", 3),
+                                 ("LR_AP2", 9), ("K_AP2", 4)]]),
+]
+
+
+def buildDistanceModel(rows, cols, aptSpecs, doubled):
+    model = cp_model.CpModel()
+    if doubled:
+        useDoubledCoordinates(model)
+    apartments = [[createRoom(val, minArea) for val, minArea in aptSpec] for aptSpec in aptSpecs]
+    rooms = [room for apt in apartments for room in apt]
+    for room in rooms:
+        roomIntervalConstraint(model, room, rows, cols)
+    noOverlapConstraint(model, rooms, rows, cols)
+
+    max = rows + cols
+    scale = getDistanceScale(model)
+    totalDistBedrooms = getSum(model, [getPairWiseDistanceBetWeenBedroom(model, apt, max) for apt in apartments],
+                               scale * max * rows * cols)
+    totalDistBathrooms = getSum(model, [getPairWiseDistanceToBathRoom(model, apt, max) for apt in apartments],
+                                scale * max * rows * cols)
+    lessThan = getCountDistanceLessThan(model, [(apt[0], apt[1], 3) for apt in apartments], max)
+    model.Maximize(scale * lessThan - totalDistBedrooms - totalDistBathrooms)
+    return model, scale
+
+
+if __name__ == "__main__":
+    timeLimit = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+    print(f'{"spec":<16}{"mode":<10}{"status":<10}{"objective":>10}{"build(s)":>10}{"solve(s)":>10}')
+    for name, rows, cols, aptSpecs in SPECS:
+        for doubled in [False, True]:
+            start = time.time()
+            model, scale = buildDistanceModel(rows, cols, aptSpecs, doubled)
+            buildTime = time.time() - start
+
+            solver = cp_model.CpSolver()
+            solver.parameters.max_time_in_seconds = timeLimit
+            status = solver.Solve(model)
+            objective = solver.ObjectiveValue() / scale if status in [cp_model.OPTIMAL, cp_model.FEASIBLE] else None
+            print(f'{name:<16}{"doubled" if doubled else "division":<10}{solver.StatusName(status):<10}'
+                  f'{str(objective):>10}{buildTime:>10.3f}{solver.WallTime():>10.3f}')
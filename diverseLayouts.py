@@ -0,0 +1,105 @@
+from __future__ import print_function
+
+import argparse
+
+from ortools.sat.python import cp_model
+from ortools.sat.python.cp_model import LinearExpr
+
+from buildingSpec import loadSpec
+from generatorLogic import addFloorHints, buildFloor, getFloorRects, getFloorRooms
+from layoutRender import LayoutIndex, renderAscii, renderJson
+from layoutStore import LayoutStore
+from roomUtility import getCellIsValue
+from solverConfig import addSolverArguments, getSolverArguments, getSolverConfig, solveModel
+
+# Generates layouts that differ from each other by at least minDifference.
+# The floor is built once, after every layout a diversity constraint against it is added to the model and the
+# model is solved again (hinted with the previous layout), so every layout is the best one far enough from all the
+# previous ones. The difference is measured either on the apartment room rectangles (sum of the distances between
+# the points of the same room) or on the cells (number of cells holding another room, needs cell placement).
+
+METRICS = ["rects", "cells"]
+
+
+# Requires the apartment rooms to be at least minDifference away (sum of the point distances) from their rects,
+# corridors moving alone do not make another layout
+def addRectDiversity(model, floor, rects, minDifference):
+    gridW, gridH = len(floor["grid"]), len(floor["grid"][0])
+    distances = []
+    for room in [room for apt in floor["apartments"] for room in apt]:
+        for point, value in zip(['ax', 'ay', 'bx', 'by'], rects[room['val']]):
+            mx = gridW if point.endswith('x') else gridH
+            distance = model.NewIntVar(0, mx, '')
+            model.AddAbsEquality(distance, room[point] - value)
+            distances.append(distance)
+    model.Add(LinearExpr.Sum(distances) >= minDifference)
+
+
+# Requires at least minDifference cells to hold another value than in grid (domain indices)
+def addCellDiversity(model, floor, grid, minDifference):
+    if floor["grid"][0][0] is None:
+        raise ValueError("The cell distance needs rooms placed per cell, use the rects distance with intervals")
+    same = [getCellIsValue(model, cell, int(value)) for row, values in zip(floor["grid"], grid)
+            for cell, value in zip(row, values)]
+    model.Add(LinearExpr.Sum(same) <= len(same) - minDifference)
+
+
+# Yields up to count layouts of the spec, each at least minDifference away from all the previous ones.
+# Every layout is the layout dict of layoutRender.py with the rects by room code (rooms), the domain, the objective and
+# the solve result, it is yielded as soon as it is found
+def generateDiverseLayouts(spec, count=10, minDifference=4, metric="rects", solverOverrides=None):
+    if metric not in METRICS:
+        raise ValueError(f'Unknown layout distance {metric}, expected one of {METRICS}')
+    model = cp_model.CpModel()
+    floor = buildFloor(model, spec)
+    index = LayoutIndex(floor["grid"], floor["domain"], [getFloorRooms(floor)], floor["objectiveTerms"])
+    config = getSolverConfig(spec, **(solverOverrides or {}))
+
+    for _ in range(count):
+        solver, result = solveModel(model, config)
+        if result["status"] not in ["OPTIMAL", "FEASIBLE"]:
+            return
+        layout = index.extractFrom(solver)
+        layout["rooms"] = getFloorRects(solver.Value, floor)
+        layout["domain"] = floor["domain"]
+        layout["objective"] = result["objective"]
+        layout["result"] = result
+        yield layout
+
+        if metric == "rects":
+            addRectDiversity(model, floor, layout["rooms"], minDifference)
+        else:
+            addCellDiversity(model, floor, layout["grid"], minDifference)
+        model.ClearHints()
+        addFloorHints(model, floor, layout["rooms"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate several meaningfully different layouts of a floor")
+    parser.add_argument("spec", help="json/yaml building spec")
+    parser.add_argument("--count", type=int, default=10, help="number of layouts")
+    parser.add_argument("--min-difference", type=int, default=4, help="minimum distance between two layouts")
+    parser.add_argument("--metric", choices=METRICS, default="rects", help="how the distance is measured")
+    parser.add_argument("--output", help="json lines file the layouts are written to")
+    parser.add_argument("--store", help="layout store (see layoutStore.py) the layouts are added to")
+    addSolverArguments(parser)
+    args = parser.parse_args()
+
+    spec = loadSpec(args.spec)
+    output = open(args.output, "w") if args.output else None
+    store = None
+    for number, layout in enumerate(generateDiverseLayouts(spec, args.count, args.min_difference, args.metric,
+                                                           getSolverArguments(args))):
+        print(f'Layout {number + 1}: objective {layout["objective"]} in {layout["result"]["wallTime"]}s')
+        print(renderAscii(layout, layout["domain"]))
+        print()
+        if output:
+            output.write(renderJson(layout, list(layout["rooms"]), objective=layout["objective"]) + "\n")
+            output.flush()
+        if args.store:
+            if store is None:
+                store = LayoutStore(args.store, layout["domain"], list(layout["rooms"]), layout["grid"].shape)
+            if not store.add(layout, layout["objective"]):
+                print("(already in the store)")
+    if output:
+        output.close()
@@ -1,61 +1,66 @@
 from __future__ import print_function
 
+import argparse
+import sys
+
 from ortools.sat.python import cp_model
 
+from buildingSpec import loadSpec, readSpecFromInput
 from constraints import *
+from profiling import disableProfiling, enableProfiling, printReport, saveReport
+from solutionCache import DEFAULT_CACHE_DIR, SolutionCache
+from layoutRender import renderAscii, renderJson, renderSvg, savePng
 from solutionPrinter import SolutionPrinterWithLimit
-
-if __name__ == "__main__":
-    model = cp_model.CpModel()
-    numberOfApartments = int(input("Enter number of apartments: "))
-    widthOfBuilding = int(input("Enter width of building(rows): "))
-    lengthOfBuilding = int(input("Enter height of building(cols): "))
-    print("You will be asked some questions answer by y/n")
-    isOpenWall = [0,0,0,0]
-    for i in range(4):
-        isOpenWall[i] = "y" in input("is the wall number "+ str(i+1)+ " on an open area: ")
-
-    onOpenArea = {
-        "left": isOpenWall[0], "right": isOpenWall[1], "top": isOpenWall[2], "bottom": isOpenWall[3]
-    }
-
-    domain = ['D']
-
-    allApartmentsOnOpenArea = "y" in input("Should all apartments have look on landscape view? ")
-    allEqualDistanceToElev = "y" in input("Should all apartments be of an equal distance to the elevators unit? ")
-    symmetricApartements = "y" in input("Should apartments of same type be symmetric? ")
+from solverConfig import addSolverArguments, getSolverArguments, getSolverConfig, solveModel
+from specAnalysis import InfeasibleSpecError, checkSpec
+from symmetryBreaking import breakSymmetries
+
+
+# Constraint groups that can be guarded by an enforcement literal
+OPTIONAL_GROUPS = ["openArea", "equalElevatorDistance", "symmetry", "goldenRatio"]
+
+
+# Builds the whole floor described by the building spec into model.
+# Returns the floor: the grid, the domain, the apartments and corridors (lists of room dicts)
+# and the terms of the objective.
+# windows optionally maps room codes to the (lo, hi) range of each of their points (see createRoomPoints).
+# enforcement optionally maps optional constraint groups (OPTIONAL_GROUPS) to a literal, those groups are posted
+# whatever the flags of the spec say and only hold when their literal is true (see layoutSession.py).
+# Raises InfeasibleSpecError (before posting anything) when the spec is obviously impossible, the groups of
+# enforcement are not part of that check since their literal can be false
+def buildFloor(model, spec, windows=None, enforcement=None):
+    enforcement = enforcement or {}
+    checkSpec(spec, enforcement)
+    options = spec["options"]
+    numberOfApartments = len(spec["apartments"])
+    widthOfBuilding = spec["width"]
+    lengthOfBuilding = spec["length"]
+    onOpenArea = spec["openWalls"]
+    useIntervalPlacement = options["placement"] == "intervals"
+    connectivityMethod = options["connectivity"]
+    useDimensionTable = options["dimensionTable"]
+
+    domain = Domain(['D'])
 
     divPropRooms = []
-    sameTypePairs = []
-    numberOfPairs = int(input("Please enter number of same type apartment pairs: "))
-    for i in range(numberOfPairs):
-        print("Pair number "+str(i+1))
-        x = int(input("Please enter id (1 indexed) of first apartment in the pair: ")) -1
-        y = int(input("Please enter id (1 indexed) of second apartment in the pair: ")) -1
-        sameTypePairs.append([x,y])
-
     apartments = []
-    for i in range (numberOfApartments):
-        numberOfRooms = int(input("Please enter the number of rooms of apartment number "+str(i+1)+": "))
+    for apt in spec["apartments"]:
         curRooms = []
-        for j in range(numberOfRooms):
-            curRoomName = input("Please enter room code for room number "+str(j+1)+":")
-            curMinArea = int(input("Please enter minimum area for room number "+str(j+1)+":"))
-            curMinHeight = int(input("Please enter minimum height for room number "+str(j+1)+":"))
-            curMinWidth = int(input("Please enter minimum width for room number "+str(j+1)+":"))
-            curRoom = createRoom(curRoomName,curMinArea,curMinHeight,curMinWidth)
+        for room in apt:
+            # a golden ratio that can be turned off must not shrink the dimensions of the room
+            curRoom = createRoom(room["code"], room["minArea"], room["minHeight"], room["minWidth"],
+                                 goldenRatio=room["goldenRatio"] and "goldenRatio" not in enforcement)
             curRooms.append(curRoom)
-
-            divineProportion = "y" in input(
-                "Should we aim to allocate spaces with ratios following the divine proportion for this room? ")
-            if (divineProportion): divPropRooms.append(curRoom)
-
+            if (room["goldenRatio"]): divPropRooms.append(curRoom)
         apartments.append(curRooms)
 
-
     corridors = [createRoom(f'xxxxxxxx{i}', 1) for i in range(numberOfApartments)]
     corridors += [createRoom("ELR", 1), createRoom("SW", 1)]
 
+    if windows:
+        for room in corridors + [room for apartment in apartments for room in apartment]:
+            room['window'] = windows.get(room['val'])
+
     rooms = [room for apartment in apartments for room in apartment]
     rooms = map(lambda room: room['val'], rooms)
     domain += rooms
@@ -65,84 +70,207 @@ if __name__ == "__main__":
 
     grid = []
     for i in range(widthOfBuilding):
-        col = [model.NewIntVar(0, len(domain) - 1, '(' + str(i) + ',' + str(j) + ')')
-               for j in range(lengthOfBuilding)]
+        if useIntervalPlacement:
+            # the grid only carries the floor shape, cells are derived from the rooms when printing
+            col = [None for j in range(lengthOfBuilding)]
+        else:
+            col = [model.NewIntVar(0, len(domain) - 1, '(' + str(i) + ',' + str(j) + ')')
+                   for j in range(lengthOfBuilding)]
         grid += [col]
 
+    allRooms = corridors + [room for apartment in apartments for room in apartment]
 
     for corridor in corridors:
-        roomConstraint(model, corridor, grid, domain)
+        if useIntervalPlacement:
+            roomIntervalConstraint(model, corridor, widthOfBuilding, lengthOfBuilding, useDimensionTable)
+        else:
+            roomConstraint(model, corridor, grid, domain, useDimensionTable)
 
     for apIdx, ap in enumerate(apartments):
         for roomIdx, room in enumerate(ap):
-            roomConstraint(model, room, grid, domain)
-            if 'SN_' in room['val']:
+            if useIntervalPlacement:
+                roomIntervalConstraint(model, room, widthOfBuilding, lengthOfBuilding, useDimensionTable)
+            else:
+                roomConstraint(model, room, grid, domain, useDimensionTable)
+            if getRoomInfo(room['val']).isSun:
                 sunRoomConstraint(model, room, grid)
-            roomAdjacencyConstraint(model, room, grid, domain)
-
-    enforceComponencyConstraint(model, corridors)
 
-    max = len(grid) + len(grid[0])
-    countSunRooms = getCountSunRooms(model, apartments, grid)
+    if useIntervalPlacement:
+        noOverlapConstraint(model, allRooms, widthOfBuilding, lengthOfBuilding)
 
-    distLessThan = []
-    numberDistanceLessThanPairs = int(
-        input("Please enter the number of room pairs for which you want to specify distance less than: "))
+    for apIdx, ap in enumerate(apartments):
+        for roomIdx, room in enumerate(ap):
+            if useIntervalPlacement:
+                intervalRoomAdjacencyConstraint(model, room, allRooms, domain, widthOfBuilding,
+                                                lengthOfBuilding)
+            else:
+                roomAdjacencyConstraint(model, room, grid, domain)
 
-    for i in range(numberDistanceLessThanPairs):
-        apartmentId = int(input("please enter apartment Id (1 indexed) for the pair number " +str(i+1)+": "))-1
-        x = int(input("please enter room Id (1 indexed) for the first room: "))-1
-        y = int(input("please enter room Id (1 indexed) for the second room: "))-1
-        d = int(input("please enter the distance: "))
-        distLessThan.append((apartments[apartmentId][x],apartments[apartmentId][y],d))
+    enforceComponencyConstraint(model, corridors, connectivityMethod)
 
-    distGreaterThan = []
-    numberDistanceGreaterThanPairs = int(
-        input("Please enter the number of room pairs for which you want to specify distance greater than: "))
+    max = len(grid) + len(grid[0])
+    if options["doubledDistances"]:
+        useDoubledCoordinates(model)
+    scale = getDistanceScale(model)
+    countSunRooms = getCountSunRooms(model, apartments, grid)
 
-    for i in range(numberDistanceGreaterThanPairs):
-        apartmentId = int(input("please enter apartment Id (1 indexed) for the pair number " + str(i + 1)+": ")) - 1
-        x = int(input("please enter room Id (1 indexed) for the first room: ")) - 1
-        y = int(input("please enter room Id (1 indexed) for the second room: ")) - 1
-        d = int(input("please enter the distance: "))
-        distGreaterThan.append((apartments[apartmentId][x], apartments[apartmentId][y],d))
+    distLessThan = [getDistanceRule(apartments, rule) for rule in spec["distanceLessThan"]]
+    distGreaterThan = [getDistanceRule(apartments, rule) for rule in spec["distanceGreaterThan"]]
 
     countLessThan = getCountDistanceLessThan(model, distLessThan, max)
     countGreaterThan = getCountDistanceGreaterThan(model, distGreaterThan, max)
 
     totalDistBedrooms = getSum(model, [getPairWiseDistanceBetWeenBedroom(model, apt, max) for apt in apartments],
-                               max * (len(grid) * len(grid[0]) ** 2))
+                               scale * max * (len(grid) * len(grid[0]) ** 2))
     totalDistBathrooms = getSum(model, [getPairWiseDistanceToBathRoom(model, apt, max) for apt in apartments],
-                                max * (len(grid) * len(grid[0]) ** 2))
+                                scale * max * (len(grid) * len(grid[0]) ** 2))
 
     for apt in apartments:
-        aptAdjacencyConstraint(model, apt, grid, domain)
-        enforceComponencyConstraint(model, apt)
-        if (allApartmentsOnOpenArea):
-            aptOpenAreaConstraint(model, apt, onOpenArea, grid)
+        if useIntervalPlacement:
+            intervalAptAdjacencyConstraint(model, apt, corridors)
+        else:
+            aptAdjacencyConstraint(model, apt, grid, domain)
+        enforceComponencyConstraint(model, apt, connectivityMethod)
+        if (spec["allApartmentsOnOpenArea"] or "openArea" in enforcement):
+            aptOpenAreaConstraint(model, apt, onOpenArea, grid, enforcement.get("openArea"))
+
+    midX = lengthOfBuilding // 2
+    mirrored = spec["symmetricApartments"] or "symmetry" in enforcement
+    if (mirrored):
+        for pair in spec["sameTypePairs"]:
+            ensureApartmentSymmetry(model, apartments[pair[0]], apartments[pair[1]], midX, enforcement.get("symmetry"))
+
+    if (spec["allEqualDistanceToElevator"] or "equalElevatorDistance" in enforcement):
+        ensureEqualDistanceToElevator(model, apartments, corridors[numberOfApartments],
+                                      widthOfBuilding + lengthOfBuilding, enforcement.get("equalElevatorDistance"))
+
+    if options["symmetryBreaking"]:
+        distanceRules = [(rule["apartment"], rule["rooms"][0], rule["rooms"][1], kind, rule["distance"])
+                         for kind in ["distanceLessThan", "distanceGreaterThan"] for rule in spec[kind]]
+        # the mirrored ordering is a subset of the plain one, so it stays valid when the symmetry is turned off
+        breakSymmetries(model, apartments, lengthOfBuilding, spec["sameTypePairs"], mirrored, distanceRules)
+
+    # with dimension tables the golden ratio is already part of the table of the room
+    if not useDimensionTable or "goldenRatio" in enforcement:
+        for room in divPropRooms:
+            ensureGoldenRatio(model, room, widthOfBuilding + lengthOfBuilding, enforcement.get("goldenRatio"))
+
+    # distances are multiplied by the distance scale, so are the counts to keep the same weights
+    model.Maximize(scale * (countSunRooms + countLessThan + countGreaterThan) - totalDistBedrooms - totalDistBathrooms)
+
+    return {
+        "grid": grid,
+        "domain": domain,
+        "apartments": apartments,
+        "corridors": corridors,
+        "objectiveTerms": [countSunRooms, countLessThan, countGreaterThan, totalDistBedrooms, totalDistBathrooms],
+    }
+
+
+def getFloorRooms(floor):
+    return [room for apt in floor["apartments"] for room in apt] + floor["corridors"]
 
 
+# Returns the rectangle of every room of the floor in a solution, value is solver.Value (or the callback's)
+def getFloorRects(value, floor):
+    return {room['val']: getRoomRect(value, room) for room in getFloorRooms(floor)}
 
-    midX = lengthOfBuilding //2 
-    if (symmetricApartements):
-        for pair in sameTypePairs:
-            ensureApartmentSymmetry(model,apartments[pair[0]],apartments[pair[1]], midX)
 
+# Hints the solver with the rectangles of the rooms (room code -> rect), unknown rooms are left alone
+def addFloorHints(model, floor, rects):
+    for room in getFloorRooms(floor):
+        if room['val'] in rects:
+            addRoomHint(model, room, rects[room['val']])
 
-    if (allEqualDistanceToElev):
-        ensureEqualDistanceToElevator(model,apartments,corridors[numberOfApartments],widthOfBuilding+lengthOfBuilding)
 
-    for room in divPropRooms:
-        ensureGoldenRatio(model, room, widthOfBuilding+lengthOfBuilding)
+# Fixes the rooms on their rectangles (room code -> rect), unknown rooms are left alone
+def fixFloorRects(model, floor, rects):
+    for room in getFloorRooms(floor):
+        if room['val'] in rects:
+            for point, value in zip(['ax', 'ay', 'bx', 'by'], rects[room['val']]):
+                model.Add(room[point] == value)
 
-    model.Maximize(countSunRooms + countLessThan + countGreaterThan - totalDistBedrooms - totalDistBathrooms)
 
-    solver = cp_model.CpSolver()
-    status = solver.Solve(model)
-    print(solver.StatusName())
-    solution_printer = SolutionPrinterWithLimit(10, grid, domain, apartments + [corridors],
-                                                [countSunRooms, countLessThan, countGreaterThan, totalDistBedrooms,
-                                                 totalDistBathrooms])
-    solution_printer.printSolution(solver)
+# Returns the (room, room, distance) tuple of a distance rule of the spec
+def getDistanceRule(apartments, rule):
+    apt = apartments[rule["apartment"]]
+    return apt[rule["rooms"][0]], apt[rule["rooms"][1]], rule["distance"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the layout of a residential floor")
+    parser.add_argument("spec", nargs="?", help="json/yaml building spec, the spec is asked for when omitted")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_DIR, default=None, metavar="DIR",
+                        help=f'hint the solve with cached layouts of this (or a close) spec and cache the result '
+                             f'(default directory: {DEFAULT_CACHE_DIR})')
+    parser.add_argument("--model-cache", nargs="?", const=".modelCache", default=None, metavar="DIR",
+                        help="load the built model of the spec from this directory (built and saved on a miss)")
+    parser.add_argument("--profile", nargs="?", const="", default=None, metavar="FILE",
+                        help="report the variables, constraints and time of every constraint builder "
+                             "(and save it as json to FILE)")
+    parser.add_argument("--solutions", metavar="FILE",
+                        help="write every intermediate solution to FILE as json lines (from a background thread)")
+    parser.add_argument("--plan", metavar="FILE", help="save the floor plan of the final layout, "
+                                                       "the format follows the extension: .svg, .png, .json or text")
+    addSolverArguments(parser)
+    args = parser.parse_args()
+
+    spec = loadSpec(args.spec) if args.spec else readSpecFromInput()
+    if args.profile is not None:
+        enableProfiling()
+
+    try:
+        if args.model_cache:
+            # modelCache builds floors with this module, it can only be imported once this module is loaded
+            from modelCache import ModelCache
+            model, floor = ModelCache(args.model_cache).getFloor(spec)
+        else:
+            model = cp_model.CpModel()
+            floor = buildFloor(model, spec)
+    except InfeasibleSpecError as e:
+        print("The building spec is impossible:")
+        for reason in e.reasons:
+            print(f'  {reason}')
+        raise SystemExit(1)
+
+    if args.profile is not None:
+        profile = disableProfiling()
+        printReport(profile)
+        if args.profile:
+            saveReport(profile, args.profile)
+
+    cache = SolutionCache(args.cache) if args.cache else None
+    if cache:
+        addFloorHints(model, floor, cache.findHints(spec))
+
+    # intermediate solutions written to a file do not stop the search
+    solution_printer = SolutionPrinterWithLimit(sys.maxsize if args.solutions else 10, floor["grid"], floor["domain"],
+                                                floor["apartments"] + [floor["corridors"]], floor["objectiveTerms"],
+                                                args.solutions)
+    solver, result = solveModel(model, getSolverConfig(spec, **getSolverArguments(args)),
+                                solution_printer if args.solutions else None)
+    solution_printer.close()
+    print(result["status"])
+    if cache and result["status"] in ["OPTIMAL", "FEASIBLE"]:
+        cache.store(spec, getFloorRects(solver.Value, floor), result["objective"])
+    print(f'Variables: {len(model.Proto().variables)}, constraints: {len(model.Proto().constraints)}, '
+          f'wall time: {result["wallTime"]}s, user time: {result["userTime"]}s, '
+          f'deterministic time: {result["deterministicTime"]}')
+    print(f'Geometry cache: {getGeometryStats(model)}')
+    if result["status"] in ["OPTIMAL", "FEASIBLE"]:
+        solution_printer.printSolution(solver)
+        if args.plan:
+            layout = solution_printer.getLayout(solver)
+            codes = [room['val'] for room in getFloorRooms(floor)]
+            if args.plan.endswith(".png"):
+                savePng(layout, floor["domain"], args.plan)
+            else:
+                with open(args.plan, "w") as file:
+                    if args.plan.endswith(".svg"):
+                        file.write(renderSvg(layout, codes))
+                    elif args.plan.endswith(".json"):
+                        file.write(renderJson(layout, codes, objective=result["objective"]))
+                    else:
+                        file.write(renderAscii(layout, floor["domain"]))
     # status = solver.SearchForAllSolutions(model, solution_printer)getCount
     # print(solver.StatusName())
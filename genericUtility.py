@@ -1,5 +1,15 @@
+from weakref import WeakKeyDictionary
+
 from ortools.sat.python.cp_model import LinearExpr
 
+_modelCaches = WeakKeyDictionary()
+
+
+# Returns a dictionary that lives as long as the model, used to share literals between constraints
+def getModelCache(model, name):
+    caches = _modelCaches.setdefault(model, {})
+    return caches.setdefault(name, {})
+
 
 def isAnd(model, variables, name=None):
     if name is None:
@@ -40,6 +50,22 @@ def isEqual(model, variable1, variable2, name=None):
     return equal
 
 
+def isLessOrEqual(model, variable1, variable2, name=None):
+    if name is None:
+        name = ''
+    b = model.NewBoolVar(name)
+    model.Add(variable1 <= variable2).OnlyEnforceIf(b)
+    model.Add(variable1 > variable2).OnlyEnforceIf(b.Not())
+    return b
+
+
+# Only enforces the constraint when literal is true, a None literal leaves the constraint unconditional
+def enforceIf(constraint, literal):
+    if literal is not None:
+        constraint.OnlyEnforceIf(literal)
+    return constraint
+
+
 def getSum(model, boolVars, max):
     count = model.NewIntVar(0, max, '')
     model.Add(LinearExpr.Sum(boolVars) == count)
@@ -0,0 +1,293 @@
+from __future__ import print_function
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from ortools.sat.python import cp_model
+
+from buildingSpec import loadSpec
+from constraints import *
+from generatorLogic import buildFloor, fixFloorRects
+from solverConfig import addSolverArguments, getSolverArguments, getSolverConfig, solveModel
+from specAnalysis import checkSpec
+
+# Hierarchical two phase solve of a floor:
+#   phase one places every apartment as a single rectangle (block) along with the corridors, the elevator (ELR)
+#   and the stairs (SW), using aggregate areas and the open area / sun / symmetry rules at block level
+#   phase two lays out the rooms of every apartment inside its block as an independent model, in parallel worker
+#   processes, then the blocks are stitched back into one grid
+# When the interior of a block is infeasible the block is excluded and phase one is solved again.
+
+SIDES = ["top", "bottom", "left", "right"]
+MIRRORED_SIDES = {"top": "top", "bottom": "bottom", "left": "right", "right": "left"}
+
+
+# Builds the phase one model: one block per apartment plus the corridors, with the block rectangles of
+# excludedBlocks ((apartment, (ax, ay, bx, by)) pairs) forbidden
+def buildBlockFloor(model, spec, excludedBlocks=[]):
+    gridW = spec["width"]
+    gridH = spec["length"]
+    apartments = spec["apartments"]
+    shape = [[None for j in range(gridH)] for i in range(gridW)]
+
+    blocks = []
+    for aptIdx, apt in enumerate(apartments):
+        minimums = [getMinimumDimensions(room, gridW, gridH) for room in apt]
+        blocks.append(createRoom(f'APT{aptIdx}', sum(area for width, height, area in minimums),
+                                 max(height for width, height, area in minimums),
+                                 max(width for width, height, area in minimums)))
+
+    corridors = [createRoom(f'xxxxxxxx{i}', 1) for i in range(len(apartments))]
+    corridors += [createRoom("ELR", 1), createRoom("SW", 1)]
+
+    for room in blocks + corridors:
+        roomIntervalConstraint(model, room, gridW, gridH, spec["options"]["dimensionTable"])
+    noOverlapConstraint(model, blocks + corridors, gridW, gridH)
+
+    enforceComponencyConstraint(model, corridors, 'flow')
+    for aptIdx, block in enumerate(blocks):
+        intervalAptAdjacencyConstraint(model, [block], corridors)
+        if any(getRoomInfo(room["code"]).isSun for room in apartments[aptIdx]):
+            sunRoomConstraint(model, block, shape)
+        if spec["allApartmentsOnOpenArea"]:
+            aptOpenAreaConstraint(model, [block], spec["openWalls"], shape)
+
+    if spec["symmetricApartments"]:
+        for first, second in spec["sameTypePairs"]:
+            ensureApartmentSymmetry(model, [blocks[first]], [blocks[second]], gridH // 2)
+    if spec["allEqualDistanceToElevator"]:
+        # block level approximation of the rule: distance from the centre of the block
+        ensureEqualDistanceToElevator(model, [[block] for block in blocks], corridors[len(apartments)], gridW + gridH)
+
+    for aptIdx, rect in excludedBlocks:
+        block = blocks[aptIdx]
+        model.AddBoolOr([isEqual(model, block[point], value).Not()
+                         for point, value in zip(['ax', 'ay', 'bx', 'by'], rect)])
+
+    # larger blocks leave more room to the interiors
+    model.Maximize(LinearExpr.Sum([block['area'] for block in blocks]))
+    return blocks, corridors
+
+
+# Returns, for the block rect, the local cells next to a corridor and the sides lying on the floor border
+def getBlockContext(rect, corridorRects, gridW, gridH):
+    ax, ay, bx, by = rect
+    accessCells = set()
+    for cax, cay, cbx, cby in corridorRects:
+        for rowIdx in range(ax, bx + 1):
+            for colIdx in range(ay, by + 1):
+                neighbours = [(rowIdx - 1, colIdx), (rowIdx + 1, colIdx), (rowIdx, colIdx - 1), (rowIdx, colIdx + 1)]
+                if any(cax <= r <= cbx and cay <= c <= cby for r, c in neighbours):
+                    accessCells.add((rowIdx - ax, colIdx - ay))
+    floorSides = [side for side, onBorder in
+                  zip(SIDES, [ax == 0, bx == gridW - 1, ay == 0, by == gridH - 1]) if onBorder]
+    return sorted(accessCells), floorSides
+
+
+# Returns the phase two task of the apartment: everything the worker needs to lay out its interior
+def createInteriorTask(spec, aptIdx, rect, corridorRects, mirrorRect=None):
+    gridW = spec["width"]
+    gridH = spec["length"]
+    ax, ay, bx, by = rect
+    width, height = bx - ax + 1, by - ay + 1
+    accessCells, floorSides = getBlockContext(rect, corridorRects, gridW, gridH)
+    accessSets = [accessCells]
+    sideSets = [floorSides]
+    if mirrorRect is not None:
+        # the mirrored apartment reuses this interior, so its own requirements are added mirrored
+        mirrorCells, mirrorSides = getBlockContext(mirrorRect, corridorRects, gridW, gridH)
+        accessSets.append([(r, height - 1 - c) for r, c in mirrorCells])
+        sideSets.append([MIRRORED_SIDES[side] for side in mirrorSides])
+
+    rules = [(rule["rooms"][0], rule["rooms"][1], kind, rule["distance"])
+             for kind in ["distanceLessThan", "distanceGreaterThan"]
+             for rule in spec[kind] if rule["apartment"] == aptIdx]
+    return {
+        "apartment": aptIdx,
+        "rooms": spec["apartments"][aptIdx],
+        "width": width,
+        "height": height,
+        "accessSets": accessSets,
+        "sideSets": sideSets,
+        "openWalls": spec["openWalls"],
+        "allApartmentsOnOpenArea": spec["allApartmentsOnOpenArea"],
+        "distanceRules": rules,
+        "options": spec["options"],
+        "solver": getSolverConfig(spec),
+    }
+
+
+# Returns a boolean variable that specifies whether the room lies on the side of a width x height block
+def isOnSide(model, room, side, width, height):
+    if side in ["top", "bottom"]:
+        return isOnBorder(model, 0 if side == "top" else width - 1, True, room)
+    return isOnBorder(model, 0 if side == "left" else height - 1, False, room)
+
+
+# Builds the phase two model of an apartment interior, the block is a grid of its own
+def buildBlockInterior(model, task):
+    width = task["width"]
+    height = task["height"]
+    options = task["options"]
+    rooms = [createRoom(room["code"], room["minArea"], room["minHeight"], room["minWidth"],
+                        goldenRatio=room["goldenRatio"]) for room in task["rooms"]]
+    domain = Domain(['D'] + [room['val'] for room in rooms])
+    grid = [[model.NewIntVar(0, len(domain) - 1, '(' + str(i) + ',' + str(j) + ')') for j in range(height)]
+            for i in range(width)]
+
+    for room in rooms:
+        roomConstraint(model, room, grid, domain, options["dimensionTable"])
+    for room in rooms:
+        roomAdjacencyConstraint(model, room, grid, domain)
+        if getRoomInfo(room['val']).isSun:
+            for sides in task["sideSets"]:
+                model.AddBoolOr([isOnSide(model, room, side, width, height) for side in sides])
+    enforceComponencyConstraint(model, rooms, options["connectivity"])
+
+    # one of the rooms has to reach the corridor
+    for cells in task["accessSets"]:
+        model.AddBoolOr([getCellIsValue(model, grid[r][c], 0).Not() for r, c in cells])
+
+    if task["allApartmentsOnOpenArea"]:
+        for sides in task["sideSets"]:
+            openSides = [side for side in sides if task["openWalls"][side]]
+            model.AddBoolOr([isOnSide(model, room, side, width, height) for room in rooms for side in openSides])
+
+    if not options["dimensionTable"]:
+        for room in rooms:
+            if room['goldenRatio']:
+                ensureGoldenRatio(model, room, width + height)
+
+    max = width + height
+    if options["doubledDistances"]:
+        useDoubledCoordinates(model)
+    scale = getDistanceScale(model)
+    countSunRooms = getSum(model, [isOr(model, [isOnSide(model, room, side, width, height)
+                                                for side in task["sideSets"][0]])
+                                   for room in rooms if task["sideSets"][0]], len(rooms))
+    countLessThan = getCountDistanceLessThan(model, [(rooms[a], rooms[b], d) for a, b, kind, d in
+                                                     task["distanceRules"] if kind == "distanceLessThan"], max)
+    countGreaterThan = getCountDistanceGreaterThan(model, [(rooms[a], rooms[b], d) for a, b, kind, d in
+                                                           task["distanceRules"] if kind == "distanceGreaterThan"], max)
+    totalDistBedrooms = getPairWiseDistanceBetWeenBedroom(model, rooms, max)
+    totalDistBathrooms = getPairWiseDistanceToBathRoom(model, rooms, max)
+    model.Maximize(scale * (countSunRooms + countLessThan + countGreaterThan) - totalDistBedrooms - totalDistBathrooms)
+    return rooms
+
+
+# Solves the interior of one block, runs inside a worker process
+def solveBlockInterior(task):
+    model = cp_model.CpModel()
+    rooms = buildBlockInterior(model, task)
+    solver, result = solveModel(model, task["solver"])
+    result["apartment"] = task["apartment"]
+    if result["status"] in ["OPTIMAL", "FEASIBLE"]:
+        result["rooms"] = {room['val']: getRoomRect(solver.Value, room) for room in rooms}
+    return result
+
+
+# Returns the local rects of the mirrored apartment from the ones of the solved apartment
+def mirrorInterior(rooms, sourceApt, targetApt, height):
+    mirrored = {}
+    for source, target in zip(sourceApt, targetApt):
+        ax, ay, bx, by = rooms[source["code"]]
+        mirrored[target["code"]] = (ax, height - 1 - by, bx, height - 1 - ay)
+    return mirrored
+
+
+# Returns the status and the objective of the layout (room code -> rect) in the full floor model of the spec.
+# The interiors are optimised on their own grids (and mirrored ones are copies), so only the full model gives an
+# objective that compares with a monolithic solve
+def evaluateLayout(spec, rects, config):
+    model = cp_model.CpModel()
+    floor = buildFloor(model, spec)
+    fixFloorRects(model, floor, rects)
+    solver, result = solveModel(model, config)
+    if result["status"] not in ["OPTIMAL", "FEASIBLE"]:
+        return {"status": "INFEASIBLE" if result["status"] == "INFEASIBLE" else "UNKNOWN", "objective": None,
+                "error": f'the stitched layout is {result["status"]} in the full floor model'}
+    return {"objective": result["objective"]}
+
+
+# Solves the spec with the two phases, phase one is solved again (at most maxRounds times) when a block interior
+# is infeasible. Returns the status, the rects of every room, the stitched grid (room codes) and the objective
+def solveHierarchical(spec, processes=None, maxRounds=10, solverOverrides=None):
+    checkSpec(spec)
+    gridW = spec["width"]
+    gridH = spec["length"]
+    config = getSolverConfig(spec, **(solverOverrides or {}))
+    spec = dict(spec, solver=config)
+
+    mirrorOf = {}
+    if spec["symmetricApartments"]:
+        for first, second in spec["sameTypePairs"]:
+            mirrorOf[second] = first
+
+    excludedBlocks = []
+    for roundIdx in range(maxRounds):
+        model = cp_model.CpModel()
+        blocks, corridors = buildBlockFloor(model, spec, excludedBlocks)
+        solver, result = solveModel(model, config)
+        if result["status"] not in ["OPTIMAL", "FEASIBLE"]:
+            return {"status": result["status"], "rounds": roundIdx + 1}
+
+        blockRects = [getRoomRect(solver.Value, block) for block in blocks]
+        corridorRects = [getRoomRect(solver.Value, corridor) for corridor in corridors]
+        # only the corridors give access to an apartment, not the elevator or the stairs
+        accessRects = [rect for corridor, rect in zip(corridors, corridorRects)
+                       if getRoomInfo(corridor['val']).isCorridor]
+        tasks = [createInteriorTask(spec, aptIdx, blockRects[aptIdx], accessRects,
+                                    next((blockRects[second] for second, first in mirrorOf.items()
+                                          if first == aptIdx), None))
+                 for aptIdx in range(len(blocks)) if aptIdx not in mirrorOf]
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            interiors = {interior["apartment"]: interior for interior in executor.map(solveBlockInterior, tasks)}
+
+        failed = [aptIdx for aptIdx, interior in interiors.items() if "rooms" not in interior]
+        if failed:
+            for aptIdx in failed:
+                excludedBlocks.append((aptIdx, blockRects[aptIdx]))
+                for second, first in mirrorOf.items():
+                    if first == aptIdx:
+                        excludedBlocks.append((second, blockRects[second]))
+            continue
+
+        for second, first in mirrorOf.items():
+            ax, ay, bx, by = blockRects[first]
+            interiors[second] = {"rooms": mirrorInterior(interiors[first]["rooms"], spec["apartments"][first],
+                                                         spec["apartments"][second], by - ay + 1)}
+
+        rects = {corridor['val']: rect for corridor, rect in zip(corridors, corridorRects)}
+        for aptIdx, interior in interiors.items():
+            ax, ay = blockRects[aptIdx][0], blockRects[aptIdx][1]
+            for code, (rax, ray, rbx, rby) in interior["rooms"].items():
+                rects[code] = (ax + rax, ay + ray, ax + rbx, ay + rby)
+
+        grid = [['D' for j in range(gridH)] for i in range(gridW)]
+        for code, (ax, ay, bx, by) in rects.items():
+            for rowIdx in range(ax, bx + 1):
+                for colIdx in range(ay, by + 1):
+                    grid[rowIdx][colIdx] = code
+        result = {"status": "FEASIBLE", "rounds": roundIdx + 1, "rooms": rects, "grid": grid}
+        result.update(evaluateLayout(spec, rects, config))
+        return result
+    return {"status": "UNKNOWN", "rounds": maxRounds}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a floor in two phases: apartment blocks, then rooms")
+    parser.add_argument("spec", help="json/yaml building spec")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes for the block interiors")
+    parser.add_argument("--rounds", type=int, default=10, help="maximum number of phase one solves")
+    addSolverArguments(parser)
+    args = parser.parse_args()
+
+    result = solveHierarchical(loadSpec(args.spec), args.processes, args.rounds, getSolverArguments(args))
+    print(f'{result["status"]} after {result["rounds"]} round(s)')
+    if "grid" in result:
+        for row in result["grid"]:
+            print("".join(code + " " * (10 - len(code)) for code in row))
+        print(f'objective: {result["objective"]}')
+    if "error" in result:
+        print(result["error"])
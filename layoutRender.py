@@ -0,0 +1,151 @@
+import json
+import queue
+import threading
+
+import numpy as np
+
+from roomRegistry import getRoomInfo
+
+# Vectorized extraction and rendering of layouts.
+# The proto indices of the grid cells, room points and extra variables are gathered once (LayoutIndex), every
+# solution is then read with a single numpy take on the solution vector of the response instead of a Value() call
+# per cell. A layout is a dict {"grid": rows x cols array of domain indices, "rects": rooms x 4 array of
+# (ax, ay, bx, by), "extra": array of the extra variables} rendered to ascii, svg, png or a compact json room list.
+
+# Fill colours of the svg / png floor plans by room type (the prefix of the room code)
+ROOM_COLOURS = {
+    "D": "#ffffff", "LR": "#f4d35e", "K": "#ee964b", "BD": "#8ecae6", "MSB": "#a7c957", "DN": "#f28482",
+    "ELR": "#6d6875", "SW": "#b5838d", "xxxxxxxx": "#d9d9d9",
+}
+DEFAULT_COLOUR = "#cdb4db"
+
+
+# Returns the proto indices of variables (-1 for constants) and the values of the constants
+def getIndices(variables):
+    indices = np.full(len(variables), -1, dtype=np.int64)
+    constants = np.zeros(len(variables), dtype=np.int64)
+    for i, var in enumerate(variables):
+        if isinstance(var, (int, np.integer)):
+            constants[i] = var
+        else:
+            indices[i] = var.Index()
+    return indices, constants
+
+
+def takeValues(solution, indices, constants):
+    return np.where(indices >= 0, solution[np.maximum(indices, 0)], constants)
+
+
+class LayoutIndex:
+    """Proto indices of everything a layout is made of, gathered once per model."""
+
+    def __init__(self, grid, domain, apartments, extraVars=[]):
+        self.domain = domain
+        self.rooms = [room for apt in apartments for room in apt]
+        self.codes = [room['val'] for room in self.rooms]
+        self.shape = (len(grid), len(grid[0]))
+        # with interval placement the grid only holds None, the cells are derived from the rects
+        self.gridFromRects = grid[0][0] is None
+        self.gridIndices = None
+        if not self.gridFromRects:
+            self.gridIndices = getIndices([cell for row in grid for cell in row])
+        self.rectIndices = getIndices([room[point] for room in self.rooms for point in ['ax', 'ay', 'bx', 'by']])
+        self.extraIndices = getIndices(extraVars)
+        self.roomDomainIndices = np.array([domain.index(code) for code in self.codes], dtype=np.int64)
+
+    # Returns the layout of a solution vector (response.solution)
+    def extract(self, solution):
+        solution = np.asarray(solution, dtype=np.int64)
+        rects = takeValues(solution, *self.rectIndices).reshape(-1, 4)
+        if self.gridFromRects:
+            grid = np.zeros(self.shape, dtype=np.int64)
+            for (ax, ay, bx, by), value in zip(rects, self.roomDomainIndices):
+                grid[ax:bx + 1, ay:by + 1] = value
+        else:
+            grid = takeValues(solution, *self.gridIndices).reshape(self.shape)
+        return {"grid": grid, "rects": rects, "extra": takeValues(solution, *self.extraIndices)}
+
+    # Returns the layout of the last solution of a solver, or of the current solution inside a solution callback
+    def extractFrom(self, solverOrCallback):
+        if hasattr(solverOrCallback, "ResponseProto"):
+            return self.extract(solverOrCallback.ResponseProto().solution)
+        return self.extract(solverOrCallback.Response().solution)
+
+
+def renderAscii(layout, domain):
+    lines = [''.join(domain[cell].ljust(10) for cell in row) for row in layout["grid"]]
+    return '\n'.join(lines)
+
+
+# Returns the compact room list of a layout: [{"code", "rect": [ax, ay, bx, by]}, ...]
+def getRoomList(layout, codes):
+    return [{"code": code, "rect": rect} for code, rect in zip(codes, layout["rects"].tolist())]
+
+
+def renderJson(layout, codes, **extra):
+    return json.dumps({"rooms": getRoomList(layout, codes), **extra}, separators=(",", ":"))
+
+
+def getRoomColour(code):
+    info = getRoomInfo(code)
+    return ROOM_COLOURS.get("xxxxxxxx" if info.isCorridor else info.type, DEFAULT_COLOUR)
+
+
+# Returns the svg floor plan of a layout, rows go down and cols go right
+def renderSvg(layout, codes, cellSize=40):
+    rows, cols = layout["grid"].shape
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{cols * cellSize}" height="{rows * cellSize}">',
+             f'<rect width="{cols * cellSize}" height="{rows * cellSize}" fill="{ROOM_COLOURS["D"]}" stroke="black"/>']
+    for code, (ax, ay, bx, by) in zip(codes, layout["rects"].tolist()):
+        x, y = ay * cellSize, ax * cellSize
+        width, height = (by - ay + 1) * cellSize, (bx - ax + 1) * cellSize
+        parts.append(f'<rect x="{x}" y="{y}" width="{width}" height="{height}" fill="{getRoomColour(code)}" '
+                     f'stroke="black"/>')
+        parts.append(f'<text x="{x + width / 2}" y="{y + height / 2}" font-size="{cellSize // 4}" '
+                     f'text-anchor="middle" dominant-baseline="middle">{code}</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+# Saves the png floor plan of a layout, needs Pillow
+def savePng(layout, domain, path, cellSize=40):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("Pillow is needed to save png floor plans, install it or use svg")
+    palette = np.array([tuple(int(colour[i:i + 2], 16) for i in (1, 3, 5))
+                        for colour in map(getRoomColour, domain)], dtype=np.uint8)
+    pixels = np.repeat(np.repeat(palette[layout["grid"]], cellSize, axis=0), cellSize, axis=1)
+    # darken the cell borders so the rooms are readable
+    pixels[::cellSize, :] //= 2
+    pixels[:, ::cellSize] //= 2
+    Image.fromarray(pixels, "RGB").save(path)
+
+
+class LayoutWriter:
+    """Writes layouts as json lines on a background thread, so solution callbacks only extract and enqueue."""
+
+    def __init__(self, path, codes):
+        self.__codes = codes
+        self.__queue = queue.Queue()
+        self.__file = open(path, "w")
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                break
+            layout, extra = item
+            self.__file.write(renderJson(layout, self.__codes, **extra) + "\n")
+            self.__file.flush()
+
+    def write(self, layout, **extra):
+        self.__queue.put((layout, extra))
+
+    # Waits for the queued layouts to be written
+    def close(self):
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__file.close()
@@ -0,0 +1,306 @@
+from __future__ import print_function
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ortools.sat.python import cp_model
+
+from buildingSpec import validateSpec
+from generatorLogic import buildFloor, getFloorRooms
+from layoutRender import LayoutIndex, getRoomList
+from solverConfig import configureSolver, getSolveResult, getSolverConfig
+from specAnalysis import InfeasibleSpecError
+
+# Local layout service, asyncio HTTP on top of the standard library only.
+#   POST   /jobs                  building spec (json) -> {"id": ...}, 503 when the queue is full
+#   GET    /jobs/<id>             state, latencies and the last event of the job
+#   GET    /jobs/<id>/events      chunked stream of json lines: every improving solution as it is found, then the end
+#   DELETE /jobs/<id>             cancels the job (StopSearch when it is running)
+#   GET    /metrics               queue depth, running jobs and per job latencies
+# Jobs wait in a bounded queue and are solved by a pool of worker processes, the solutions travel back through a
+# multiprocessing queue per job and cancellation through a multiprocessing event.
+
+FINAL_EVENTS = ["done", "rejected", "error"]
+# seconds the dispatcher waits for an event before checking that the worker is still alive
+EVENT_TIMEOUT = 0.5
+
+
+class StreamingCallback(cp_model.CpSolverSolutionCallback):
+    """Sends every solution to the events queue of the job."""
+
+    def __init__(self, index, events):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.__index = index
+        self.__events = events
+
+    def on_solution_callback(self):
+        layout = self.__index.extractFrom(self)
+        self.__events.put({"type": "solution", "rooms": getRoomList(layout, self.__index.codes),
+                           "objective": self.ObjectiveValue(), "wallTime": self.WallTime()})
+
+
+# Solves a spec and streams its events, runs inside a worker process
+def runJob(spec, events, cancel):
+    try:
+        spec = validateSpec(spec)
+        model = cp_model.CpModel()
+        floor = buildFloor(model, spec)
+        index = LayoutIndex(floor["grid"], floor["domain"], [getFloorRooms(floor)])
+        solver = configureSolver(cp_model.CpSolver(), **getSolverConfig(spec))
+        done = threading.Event()
+
+        # stops the search on cancel, even when no solution reaches the callback
+        def watchCancel():
+            while not done.is_set():
+                if cancel.wait(0.1):
+                    solver.StopSearch()
+                    return
+
+        if cancel.is_set():
+            events.put({"type": "done", "cancelled": True})
+            return
+        threading.Thread(target=watchCancel, daemon=True).start()
+        status = solver.Solve(model, StreamingCallback(index, events))
+        done.set()
+        events.put({"type": "done", "cancelled": cancel.is_set(), "result": getSolveResult(solver, status)})
+    except InfeasibleSpecError as e:
+        events.put({"type": "rejected", "reasons": e.reasons})
+    except Exception as e:
+        events.put({"type": "error", "error": repr(e)})
+
+
+# Returns the next event of the queue, None when there is none within timeout seconds
+def getEvent(events, timeout):
+    try:
+        return events.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+class LayoutService:
+    """Job queue, worker pool and HTTP front of the layout service."""
+
+    def __init__(self, processes=2, queueSize=16, maxJobs=1000):
+        self.processes = processes
+        self.maxJobs = maxJobs
+        self.pending = asyncio.Queue(maxsize=queueSize)
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.manager = multiprocessing.Manager()
+        self.pool = ProcessPoolExecutor(max_workers=processes)
+
+    def submit(self, spec):
+        job = {
+            "id": str(next(self.ids)),
+            "state": "queued",
+            "spec": spec,
+            "events": [],
+            "changed": asyncio.Condition(),
+            "cancel": self.manager.Event(),
+            "submitted": time.time(),
+        }
+        # raises asyncio.QueueFull when the queue is full
+        self.pending.put_nowait(job)
+        self.jobs[job["id"]] = job
+        self.forgetOldJobs()
+        return job
+
+    # Keeps at most maxJobs finished jobs
+    def forgetOldJobs(self):
+        finished = [jobId for jobId, job in self.jobs.items() if job["state"] in FINAL_EVENTS + ["cancelled"]]
+        for jobId in finished[:max(0, len(self.jobs) - self.maxJobs)]:
+            del self.jobs[jobId]
+
+    async def cancel(self, job):
+        job["cancel"].set()
+        if job["state"] == "queued":
+            # the dispatcher skips it
+            await self.addEvent(job, {"type": "done", "cancelled": True})
+
+    async def addEvent(self, job, event):
+        now = time.time()
+        event["elapsed"] = now - job["submitted"]
+        if event["type"] == "solution" and "firstSolution" not in job:
+            job["firstSolution"] = now
+        if event["type"] in FINAL_EVENTS:
+            job["state"] = "cancelled" if event.get("cancelled") else event["type"]
+            job["finished"] = now
+        async with job["changed"]:
+            job["events"].append(event)
+            job["changed"].notify_all()
+
+    # Takes the jobs off the queue and runs them on the pool, one dispatcher per worker process
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.pending.get()
+            if job["state"] == "cancelled":
+                continue
+            job["state"] = "running"
+            job["started"] = time.time()
+            pool = self.pool
+            try:
+                events = self.manager.Queue()
+                running = loop.run_in_executor(pool, runJob, job["spec"], events, job["cancel"])
+                while True:
+                    event = await loop.run_in_executor(None, getEvent, events, EVENT_TIMEOUT)
+                    if event is None and running.done():
+                        # the final event may have been put after the timeout
+                        event = await loop.run_in_executor(None, getEvent, events, 0)
+                        if event is None:
+                            # the worker died (or returned) without a final event
+                            running.result()
+                            event = {"type": "error", "error": "the worker stopped without a final event"}
+                    if event is None:
+                        continue
+                    await self.addEvent(job, event)
+                    if event["type"] in FINAL_EVENTS:
+                        break
+                await running
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self.restartPool(pool)
+                if job["state"] == "running":
+                    await self.addEvent(job, {"type": "error", "error": repr(e)})
+
+    # Replaces the pool when a worker process died (once, whatever the number of dispatchers that saw it)
+    def restartPool(self, pool):
+        if pool is self.pool:
+            pool.shutdown(wait=False)
+            self.pool = ProcessPoolExecutor(max_workers=self.processes)
+
+    def getJobInfo(self, job):
+        info = {"id": job["id"], "state": job["state"], "solutions": sum(event["type"] == "solution"
+                                                                         for event in job["events"])}
+        if "started" in job:
+            info["queueTime"] = job["started"] - job["submitted"]
+        if "firstSolution" in job:
+            info["timeToFirstSolution"] = job["firstSolution"] - job["submitted"]
+        if "finished" in job:
+            info["totalTime"] = job["finished"] - job["submitted"]
+        if job["events"]:
+            info["lastEvent"] = job["events"][-1]
+        return info
+
+    def getMetrics(self):
+        jobs = [self.getJobInfo(job) for job in self.jobs.values()]
+        states = {}
+        for job in jobs:
+            states[job["state"]] = states.get(job["state"], 0) + 1
+        metrics = {"queueDepth": self.pending.qsize(), "running": states.get("running", 0), "states": states,
+                   "jobs": {job["id"]: {key: job[key] for key in ["state", "queueTime", "timeToFirstSolution",
+                                                                  "totalTime"] if key in job} for job in jobs}}
+        for key in ["queueTime", "timeToFirstSolution", "totalTime"]:
+            values = [job[key] for job in jobs if key in job]
+            if values:
+                metrics["mean" + key[0].upper() + key[1:]] = sum(values) / len(values)
+        return metrics
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            method, path, _ = request.decode().split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            await self.route(method, path.rstrip("/").split("/")[1:], body, writer)
+        except (ValueError, asyncio.IncompleteReadError):
+            await self.respond(writer, 400, {"error": "malformed request"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, parts, body, writer):
+        if parts == ["metrics"] and method == "GET":
+            return await self.respond(writer, 200, self.getMetrics())
+        if parts == ["jobs"] and method == "POST":
+            try:
+                job = self.submit(json.loads(body))
+            except ValueError:
+                return await self.respond(writer, 400, {"error": "the body must be a json building spec"})
+            except asyncio.QueueFull:
+                return await self.respond(writer, 503, {"error": "the job queue is full"})
+            return await self.respond(writer, 202, {"id": job["id"]})
+        if len(parts) < 2 or parts[0] != "jobs" or parts[1] not in self.jobs:
+            return await self.respond(writer, 404, {"error": "not found"})
+
+        job = self.jobs[parts[1]]
+        if len(parts) == 2 and method == "GET":
+            return await self.respond(writer, 200, self.getJobInfo(job))
+        if len(parts) == 2 and method == "DELETE":
+            await self.cancel(job)
+            return await self.respond(writer, 200, self.getJobInfo(job))
+        if parts[2:] == ["events"] and method == "GET":
+            return await self.stream(writer, job)
+        return await self.respond(writer, 404, {"error": "not found"})
+
+    async def respond(self, writer, code, payload):
+        body = json.dumps(payload).encode()
+        writer.write(f'HTTP/1.1 {code} {RESPONSES.get(code, "")}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+    # Streams the events of the job as chunked json lines until its final event
+    async def stream(self, writer, job):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n'
+                     b'Connection: close\r\n\r\n')
+        sent = 0
+        while True:
+            async with job["changed"]:
+                await job["changed"].wait_for(lambda: len(job["events"]) > sent)
+                events = job["events"][sent:]
+            for event in events:
+                line = (json.dumps(event) + "\n").encode()
+                writer.write(f'{len(line):x}\r\n'.encode() + line + b'\r\n')
+            sent += len(events)
+            await writer.drain()
+            if any(event["type"] in FINAL_EVENTS for event in events):
+                break
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.processes)]
+        print(f'Layout service listening on http://{host}:{port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+            for job in self.jobs.values():
+                job["cancel"].set()
+            self.pool.shutdown()
+            self.manager.shutdown()
+
+
+RESPONSES = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local layout service: queue building specs and stream layouts")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--processes", type=int, default=2, help="specs solved at the same time")
+    parser.add_argument("--queue-size", type=int, default=16, help="specs waiting at most")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(LayoutService(args.processes, args.queue_size).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,124 @@
+from __future__ import print_function
+
+import argparse
+
+from ortools.sat.python import cp_model
+
+from buildingSpec import loadSpec
+from generatorLogic import OPTIONAL_GROUPS, addFloorHints, buildFloor, getFloorRects
+from solverConfig import getSolverConfig, solveModel
+
+# Incremental what-if solving of a floor: the model is built once with every optional constraint group of the spec
+# (open area, equal distance to the elevator, symmetry of the same type pairs, golden ratio rooms) guarded by an
+# enforcement literal. Groups are turned on and off between solves through solver assumptions, every solve is hinted
+# with the last layout found, and an infeasible combination is reported with a minimal set of conflicting groups.
+#   session = LayoutSession(spec)
+#   session.disable("symmetry")
+#   result = session.solve()
+
+
+class LayoutSession:
+    """Floor model built once, solved many times with different optional constraint groups."""
+
+    def __init__(self, spec, solverOverrides=None):
+        self.spec = spec
+        self.config = getSolverConfig(spec, **(solverOverrides or {}))
+        self.model = cp_model.CpModel()
+        self.literals = {group: self.model.NewBoolVar(group) for group in self.getAvailableGroups()}
+        self.floor = buildFloor(self.model, spec, enforcement=self.literals)
+        self.enabled = {
+            "openArea": spec["allApartmentsOnOpenArea"],
+            "equalElevatorDistance": spec["allEqualDistanceToElevator"],
+            "symmetry": spec["symmetricApartments"],
+            "goldenRatio": True,
+        }
+        self.enabled = {group: self.enabled[group] for group in self.literals}
+        self.lastRects = None
+
+    # Returns the optional groups that constrain something on this spec
+    def getAvailableGroups(self):
+        groups = {
+            "openArea": self.spec["allApartmentsOnOpenArea"] or any(self.spec["openWalls"].values()),
+            "equalElevatorDistance": len(self.spec["apartments"]) > 1,
+            "symmetry": len(self.spec["sameTypePairs"]) > 0,
+            "goldenRatio": any(room["goldenRatio"] for apt in self.spec["apartments"] for room in apt),
+        }
+        return [group for group in OPTIONAL_GROUPS if groups[group]]
+
+    def setGroup(self, group, enabled):
+        if group not in self.literals:
+            raise ValueError(f'Unknown constraint group {group}, expected one of {list(self.literals)}')
+        self.enabled[group] = enabled
+
+    def enable(self, group):
+        self.setGroup(group, True)
+
+    def disable(self, group):
+        self.setGroup(group, False)
+
+    def getEnabledGroups(self):
+        return [group for group in self.literals if self.enabled[group]]
+
+    # Solves the model with the groups enforced (the enabled ones by default), disabled groups are left free
+    def __solve(self, groups, config):
+        self.model.ClearAssumptions()
+        self.model.AddAssumptions([self.literals[group] for group in groups])
+        return solveModel(self.model, config)
+
+    # Solves the floor with the enabled groups, hinted with the last layout. Returns the solve result with the room
+    # rects (room code -> rect) of the layout, or the minimal conflicting groups ("conflicts") when it is infeasible
+    def solve(self):
+        self.model.ClearHints()
+        if self.lastRects:
+            addFloorHints(self.model, self.floor, self.lastRects)
+        groups = self.getEnabledGroups()
+        solver, result = self.__solve(groups, self.config)
+        result["groups"] = groups
+        if result["status"] in ["OPTIMAL", "FEASIBLE"]:
+            self.lastRects = getFloorRects(solver.Value, self.floor)
+            result["rooms"] = self.lastRects
+        elif result["status"] == "INFEASIBLE":
+            result["conflicts"] = self.getConflictingGroups(groups)
+        return result
+
+    # Returns a minimal set of the groups that can not hold together: the core found by the solver, minimized by
+    # dropping every group the rest is still infeasible without. An empty list means the floor is infeasible
+    # without any optional group
+    def getConflictingGroups(self, groups):
+        # cores are only reported by a single search worker
+        config = {**self.config, "preset": "proveInfeasible", "workers": 1}
+        solver, result = self.__solve(groups, config)
+        if result["status"] != "INFEASIBLE":
+            return groups
+        core = set(solver.SufficientAssumptionsForInfeasibility())
+        conflicts = [group for group in groups if self.literals[group].Index() in core]
+
+        for group in list(conflicts):
+            rest = [other for other in conflicts if other != group]
+            solver, result = self.__solve(rest, config)
+            if result["status"] == "INFEASIBLE":
+                conflicts = rest
+        return conflicts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a floor with optional constraint groups turned on or off")
+    parser.add_argument("spec", help="json/yaml building spec")
+    parser.add_argument("--enable", nargs="*", default=[], choices=OPTIONAL_GROUPS, help="groups to turn on")
+    parser.add_argument("--disable", nargs="*", default=[], choices=OPTIONAL_GROUPS, help="groups to turn off")
+    parser.add_argument("--time-limit", dest="timeLimit", type=float, default=None, help="time limit of every solve")
+    args = parser.parse_args()
+
+    session = LayoutSession(loadSpec(args.spec), {"timeLimit": args.timeLimit})
+    print(f'Groups of the spec: {session.getEnabledGroups()} of {list(session.literals)}')
+    result = session.solve()
+    print(f'{result["status"]} in {result["wallTime"]}s')
+    for group in args.enable:
+        session.enable(group)
+    for group in args.disable:
+        session.disable(group)
+    if args.enable or args.disable:
+        result = session.solve()
+        print(f'With {result["groups"]}: {result["status"]} in {result["wallTime"]}s')
+    if "conflicts" in result:
+        print(f'Conflicting groups: {result["conflicts"]}')
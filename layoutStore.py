@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+# Compact on disk store of the layouts of one floor (same grid size and domain), meant to be scanned with numpy
+# without loading it: a small json header followed by fixed width records
+#   hash       16 bytes, canonical hash of the grid (the same for a layout and its mirror images)
+#   objective  float64
+#   grid       width x length uint8, domain index of every cell
+#   rects      rooms x 4 uint16, (ax, ay, bx, by) of every room
+# Layouts whose canonical hash is already in the store are dropped when they are written.
+
+MAGIC = b"LAYOUTS1"
+
+
+def getRecordType(shape, rooms):
+    # raw bytes, a "S16" field would drop the trailing NUL bytes of the digest
+    return np.dtype([("hash", "u1", 16), ("objective", "<f8"), ("grid", "u1", shape), ("rects", "<u2", (rooms, 4))])
+
+
+# Returns the hash of the grid that is the same for the grid mirrored left/right, up/down or both
+def getCanonicalHash(grid):
+    grid = np.asarray(grid, dtype=np.uint8)
+    return min(hashlib.blake2b(np.ascontiguousarray(image).tobytes() + str(image.shape).encode(),
+                               digest_size=16).digest()
+               for image in [grid, grid[:, ::-1], grid[::-1, :], grid[::-1, ::-1]])
+
+
+class LayoutStore:
+    """Append only file of deduplicated layouts, readable as a numpy memmap."""
+
+    # Opens the store at path, creating it for the domain, room codes and grid shape when it does not exist yet
+    def __init__(self, path, domain=None, codes=None, shape=None):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as file:
+                if file.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f'{path} is not a layout store')
+                headerSize, = struct.unpack("<I", file.read(4))
+                header = json.loads(file.read(headerSize))
+            self.domain, self.codes, self.shape = header["domain"], header["codes"], tuple(header["shape"])
+            self.offset = len(MAGIC) + 4 + headerSize
+        else:
+            if domain is None or codes is None or shape is None:
+                raise ValueError("A new layout store needs the domain, the room codes and the grid shape")
+            if len(domain) > 256:
+                raise ValueError(f'Cells are stored as uint8, the domain has {len(domain)} values')
+            self.domain, self.codes, self.shape = list(domain), list(codes), tuple(shape)
+            header = json.dumps({"domain": self.domain, "codes": self.codes, "shape": self.shape}).encode()
+            # records start on a multiple of 8 bytes
+            header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)
+            with open(path, "wb") as file:
+                file.write(MAGIC + struct.pack("<I", len(header)) + header)
+            self.offset = len(MAGIC) + 4 + len(header)
+        self.recordType = getRecordType(self.shape, len(self.codes))
+        self.hashes = {row.tobytes() for row in self.records()["hash"]}
+
+    def __len__(self):
+        return (os.path.getsize(self.path) - self.offset) // self.recordType.itemsize
+
+    # Returns the records as a read only memmap (an empty array when the store is empty)
+    def records(self):
+        if len(self) == 0:
+            return np.zeros(0, dtype=self.recordType)
+        return np.memmap(self.path, dtype=self.recordType, mode="r", offset=self.offset, shape=(len(self),))
+
+    # Adds a layout (see layoutRender.py), returns False when it (or a mirror image of it) is already stored
+    def add(self, layout, objective=np.nan):
+        record = np.zeros(1, dtype=self.recordType)
+        record["grid"] = layout["grid"]
+        record["rects"] = layout["rects"]
+        record["objective"] = objective
+        key = getCanonicalHash(record["grid"][0])
+        if key in self.hashes:
+            return False
+        record["hash"] = np.frombuffer(key, dtype=np.uint8)
+        with open(self.path, "ab") as file:
+            file.write(record.tobytes())
+        self.hashes.add(key)
+        return True
+
+    # Returns the layout of the record i
+    def getLayout(self, i):
+        record = self.records()[i]
+        return {"grid": np.array(record["grid"], dtype=np.int64), "rects": np.array(record["rects"], dtype=np.int64),
+                "objective": float(record["objective"])}
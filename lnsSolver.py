@@ -0,0 +1,140 @@
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ortools.sat.python import cp_model
+
+from buildingSpec import loadSpec
+from generatorLogic import addFloorHints, buildFloor, fixFloorRects, getFloorRects
+from modelCache import cloneFloor, getFloorSidecar, getSidecarFloor
+from solverConfig import addSolverArguments, getSolverArguments, getSolverConfig, solveModel
+
+# Layout aware large neighbourhood search: starting from a first layout, every round frees a few neighbourhoods
+# (one apartment with its corridor, or a room and the rooms around it), fixes every other room on its rect in a copy
+# of the floor model built once, and re-optimises the neighbourhoods in parallel worker processes with a short time
+# limit. The best improving layout of the round becomes the incumbent.
+
+
+# Returns the rooms around the seed room (rects touching or overlapping the grown rect), at most size of them
+def getAdjacentNeighbourhood(rects, seed, size):
+    free = [seed]
+    while len(free) < size:
+        ax = min(rects[code][0] for code in free) - 1
+        ay = min(rects[code][1] for code in free) - 1
+        bx = max(rects[code][2] for code in free) + 1
+        by = max(rects[code][3] for code in free) + 1
+        around = [code for code, (rax, ray, rbx, rby) in rects.items()
+                  if code not in free and rax <= bx and ax <= rbx and ray <= by and ay <= rby]
+        if not around:
+            break
+        free += around[:size - len(free)]
+    return free
+
+
+# Returns count neighbourhoods (name, rooms to free), alternating between the apartments in turn and the rooms
+# around a random seed room
+def getNeighbourhoods(spec, rects, count, rng, size, roundIdx):
+    apartments = [("apartment " + str(aptIdx), [room["code"] for room in apt] + [f'xxxxxxxx{aptIdx}'])
+                  for aptIdx, apt in enumerate(spec["apartments"])]
+    neighbourhoods = []
+    for i in range(roundIdx * count, (roundIdx + 1) * count):
+        if i % 2 == 0:
+            neighbourhoods.append(apartments[i // 2 % len(apartments)])
+        else:
+            seed = rng.choice(sorted(rects))
+            neighbourhoods.append(("around " + seed, getAdjacentNeighbourhood(rects, seed, size)))
+    return neighbourhoods
+
+
+# Floor model of the worker process, built once by solveLns (see initNeighbourhoodWorker)
+baseModel = None
+baseFloor = None
+
+
+# Loads the serialized floor model (proto and sidecar, see modelCache.py) once per worker process
+def initNeighbourhoodWorker(data, sidecar):
+    global baseModel, baseFloor
+    baseModel = cp_model.CpModel()
+    baseModel.Proto().ParseFromString(data)
+    baseFloor = getSidecarFloor(baseModel, sidecar)
+
+
+# Re-optimises one neighbourhood on a copy of the floor model, runs inside a worker process
+def solveNeighbourhood(task):
+    rects, free = task["rects"], set(task["free"])
+    model, floor = cloneFloor(baseModel, baseFloor)
+    fixFloorRects(model, floor, {code: rect for code, rect in rects.items() if code not in free})
+    addFloorHints(model, floor, rects)
+    solver, result = solveModel(model, task["solver"])
+    result["neighbourhood"] = task["name"]
+    if result["status"] in ["OPTIMAL", "FEASIBLE"]:
+        result["rooms"] = getFloorRects(solver.Value, floor)
+    return result
+
+
+# Improves a layout of the spec with the large neighbourhood search. Starts from rects (room code -> rect) when
+# given, from a first layout otherwise. Stops after rounds rounds or timeLimit seconds.
+# Returns the status, the rects, the objective and the history of the accepted neighbourhoods
+def solveLns(spec, rects=None, rounds=20, timeLimit=60, processes=None, neighbourhoodTimeLimit=5, size=4, seed=0,
+             solverOverrides=None):
+    start = time.time()
+    config = getSolverConfig(spec, **(solverOverrides or {}))
+    processes = processes or os.cpu_count()
+    rng = random.Random(seed)
+
+    model = cp_model.CpModel()
+    floor = buildFloor(model, spec)
+    if rects:
+        addFloorHints(model, floor, rects)
+    solver, result = solveModel(model, {**config, "preset": "fastFirstLayout",
+                                        "timeLimit": config.get("timeLimit", timeLimit)})
+    if result["status"] not in ["OPTIMAL", "FEASIBLE"]:
+        return {"status": result["status"], "history": []}
+    rects = getFloorRects(solver.Value, floor)
+    objective = result["objective"]
+    history = [("first layout", objective, time.time() - start)]
+
+    # every neighbourhood gets its share of the cores
+    neighbourhoodConfig = {**config, "preset": None, "timeLimit": neighbourhoodTimeLimit,
+                           "workers": config.get("workers") or max(1, os.cpu_count() // processes)}
+    # the workers get the floor model once and only add the fixed rooms and the hints of every neighbourhood
+    model.ClearHints()
+    with ProcessPoolExecutor(max_workers=processes, initializer=initNeighbourhoodWorker,
+                             initargs=(model.Proto().SerializeToString(), getFloorSidecar(floor))) as executor:
+        for roundIdx in range(rounds):
+            if time.time() - start > timeLimit:
+                break
+            tasks = [{"rects": rects, "free": free, "name": name, "solver": neighbourhoodConfig}
+                     for name, free in getNeighbourhoods(spec, rects, processes, rng, size, roundIdx)]
+            results = [result for result in executor.map(solveNeighbourhood, tasks) if "rooms" in result]
+            best = max(results, key=lambda result: result["objective"], default=None)
+            if best is not None and best["objective"] > objective:
+                rects, objective = best["rooms"], best["objective"]
+                history.append((best["neighbourhood"], objective, time.time() - start))
+
+    return {"status": "FEASIBLE", "rooms": rects, "objective": objective, "history": history}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Improve the layout of a floor with a large neighbourhood search")
+    parser.add_argument("spec", help="json/yaml building spec")
+    parser.add_argument("--rounds", type=int, default=20, help="maximum number of rounds")
+    parser.add_argument("--total-time", type=float, default=60, help="time limit of the whole search in seconds")
+    parser.add_argument("--processes", type=int, default=None, help="neighbourhoods solved in parallel per round")
+    parser.add_argument("--neighbourhood-time", type=float, default=5, help="time limit of every neighbourhood")
+    parser.add_argument("--size", type=int, default=4, help="rooms freed around a seed room")
+    addSolverArguments(parser)
+    args = parser.parse_args()
+
+    result = solveLns(loadSpec(args.spec), None, args.rounds, args.total_time, args.processes,
+                      args.neighbourhood_time, args.size, args.seed or 0, getSolverArguments(args))
+    print(result["status"])
+    for name, objective, elapsed in result["history"]:
+        print(f'{elapsed:8.2f}s  {objective:>10}  {name}')
+    if "rooms" in result:
+        for code, rect in result["rooms"].items():
+            print(f'{code}: {rect}')
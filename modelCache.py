@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+
+from ortools.sat.python import cp_model
+
+from generatorLogic import buildFloor
+from solutionCache import getSpecFingerprint
+
+# On disk cache of built floor models, so repeated solves of a spec (other seeds, time limits, workers) skip the
+# model construction.
+# Every entry is the serialized CpModelProto (<fingerprint>.pb) and a json sidecar (<fingerprint>.json) that maps the
+# proto variable indices back to the floor: the grid cells, the points of every room and the objective terms.
+# Only what the floor dict exposes survives a load: the geometry cache and the intermediate helper variables are
+# still in the proto but can not be reached from python anymore.
+# Entries are keyed by the spec fingerprint and a hash of the sources of the model builder, so a change to the
+# constraints never serves a model built by the old code.
+
+DEFAULT_CACHE_DIR = ".modelCache"
+
+# modules whose code decides what buildFloor posts
+BUILDER_SOURCES = ["generatorLogic.py", "constraints.py", "roomUtility.py", "genericUtility.py", "roomRegistry.py",
+                   "symmetryBreaking.py"]
+
+ROOM_FIELDS = ['val', 'minArea', 'minHeight', 'minWidth', 'goldenRatio']
+ROOM_VARS = ['ax', 'ay', 'bx', 'by', 'area']
+
+
+# Returns the hash of the model builder sources
+@lru_cache(maxsize=None)
+def getBuilderVersion():
+    digest = hashlib.sha256()
+    for name in BUILDER_SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# Returns the cache key of the spec
+def getModelKey(spec):
+    return getSpecFingerprint(spec) + "-" + getBuilderVersion()[:16]
+
+
+def getRoomSidecar(room):
+    sidecar = {field: room[field] for field in ROOM_FIELDS}
+    sidecar["vars"] = {name: room[name].Index() for name in ROOM_VARS if room.get(name) is not None}
+    if 'xInterval' in room:
+        sidecar["intervals"] = [room['xInterval'].Index(), room['yInterval'].Index()]
+    return sidecar
+
+
+# Returns the json sidecar of a built floor
+def getFloorSidecar(floor):
+    return {
+        "domain": floor["domain"],
+        "grid": [[None if cell is None else cell.Index() for cell in row] for row in floor["grid"]],
+        "apartments": [[getRoomSidecar(room) for room in apt] for apt in floor["apartments"]],
+        "corridors": [getRoomSidecar(room) for room in floor["corridors"]],
+        "objectiveTerms": [term.Index() for term in floor["objectiveTerms"]],
+    }
+
+
+def getSidecarRoom(model, sidecar):
+    room = {field: sidecar[field] for field in ROOM_FIELDS}
+    for name, index in sidecar["vars"].items():
+        room[name] = model.GetIntVarFromProtoIndex(index)
+    if "intervals" in sidecar:
+        room['xInterval'] = model.GetIntervalVarFromProtoIndex(sidecar["intervals"][0])
+        room['yInterval'] = model.GetIntervalVarFromProtoIndex(sidecar["intervals"][1])
+    return room
+
+
+# Returns the floor of model described by a sidecar
+def getSidecarFloor(model, sidecar):
+    return {
+        "grid": [[None if index is None else model.GetIntVarFromProtoIndex(index) for index in row]
+                 for row in sidecar["grid"]],
+        "domain": sidecar["domain"],
+        "apartments": [[getSidecarRoom(model, room) for room in apt] for apt in sidecar["apartments"]],
+        "corridors": [getSidecarRoom(model, room) for room in sidecar["corridors"]],
+        "objectiveTerms": [model.GetIntVarFromProtoIndex(index) for index in sidecar["objectiveTerms"]],
+    }
+
+
+# Returns a copy of the model and its floor, so hints or extra constraints can be added without touching the original
+def cloneFloor(model, floor):
+    clone = model.Clone()
+    return clone, getSidecarFloor(clone, getFloorSidecar(floor))
+
+
+class ModelCache:
+    """Persistent cache of built floor models per building spec."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, maxEntries=20):
+        self.__directory = directory
+        self.__maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __path(self, fingerprint, extension):
+        return os.path.join(self.__directory, fingerprint + extension)
+
+    def __write(self, path, data, mode):
+        handle, tmpPath = tempfile.mkstemp(dir=self.__directory, suffix=".tmp")
+        with os.fdopen(handle, mode) as file:
+            file.write(data)
+        os.replace(tmpPath, path)
+
+    # Returns the cached model and floor of the spec (None, None if there is none)
+    def load(self, spec):
+        fingerprint = getModelKey(spec)
+        try:
+            with open(self.__path(fingerprint, ".json")) as file:
+                sidecar = json.load(file)
+            with open(self.__path(fingerprint, ".pb"), "rb") as file:
+                data = file.read()
+        except (OSError, ValueError):
+            return None, None
+        model = cp_model.CpModel()
+        model.Proto().ParseFromString(data)
+        os.utime(self.__path(fingerprint, ".json"))
+        return model, getSidecarFloor(model, sidecar)
+
+    def store(self, spec, model, floor):
+        fingerprint = getModelKey(spec)
+        # the proto goes first, a sidecar is only ever next to a complete proto
+        self.__write(self.__path(fingerprint, ".pb"), model.Proto().SerializeToString(), "wb")
+        self.__write(self.__path(fingerprint, ".json"), json.dumps(getFloorSidecar(floor)), "w")
+        self.evict()
+
+    # Returns the model and floor of the spec, loaded from the cache or built (and cached).
+    # Raises InfeasibleSpecError like buildFloor when the spec has to be built
+    def getFloor(self, spec):
+        model, floor = self.load(spec)
+        if model is not None:
+            self.hits += 1
+            return model, floor
+        self.misses += 1
+        model = cp_model.CpModel()
+        floor = buildFloor(model, spec)
+        self.store(spec, model, floor)
+        return model, floor
+
+    # Removes the least recently used entries above maxEntries
+    def evict(self):
+        sidecars = [os.path.join(self.__directory, name) for name in os.listdir(self.__directory)
+                    if name.endswith(".json")]
+        if len(sidecars) <= self.__maxEntries:
+            return
+        sidecars.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for sidecar in sidecars[:len(sidecars) - self.__maxEntries]:
+            for path in [sidecar, sidecar[:-len(".json")] + ".pb"]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,181 @@
+from __future__ import print_function
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from ortools.sat.python import cp_model
+from ortools.sat.python.cp_model import LinearExpr
+
+from buildingSpec import validateSpec
+from coarseToFine import getWindows
+from constraints import createRoom, noOverlapConstraint, roomIntervalConstraint
+from generatorLogic import buildFloor, getFloorRects
+from roomUtility import getRoomRect, isTouching
+from solutionCache import SolutionCache, getSpecFingerprint
+from solverConfig import addSolverArguments, getSolverArguments, getSolverConfig, solveModel
+from specAnalysis import InfeasibleSpecError
+
+# Multi floor generation around a vertical core: the elevator (ELR) and stairs (SW) rooms are placed once, either
+# given by the building or by a small core only solve, and every floor is solved with them fixed on the same rects.
+# Floors with the same program are solved once: the distinct programs (keyed by the fingerprint of the floor spec
+# and the core) are solved in parallel processes, and with a cache directory they are reused across runs.
+# A building is a json file:
+# {
+#   "core": {"ELR": [ax, ay, bx, by], "SW": [ax, ay, bx, by]},   \\ optional, solved when missing
+#   "floors": [<building spec>, ...]                              \\ every floor has the same width and length
+# }
+
+CORE_ROOMS = ["ELR", "SW"]
+
+
+def loadBuilding(path):
+    with open(path) as file:
+        building = json.load(file)
+    building["floors"] = [validateSpec(floor) for floor in building["floors"]]
+    sizes = {(floor["width"], floor["length"]) for floor in building["floors"]}
+    if len(sizes) != 1:
+        raise ValueError(f'Every floor needs the same width and length, got {sorted(sizes)}')
+    return building
+
+
+# Returns the reasons why the core (room code -> rect) can not be used on a gridW x gridH floor (empty if it can)
+def getCoreErrors(core, gridW, gridH):
+    if sorted(core) != sorted(CORE_ROOMS):
+        return [f'The core needs exactly the rooms {CORE_ROOMS}, got {sorted(core)}']
+    errors = []
+    for code, (ax, ay, bx, by) in core.items():
+        if not (0 <= ax <= bx < gridW and 0 <= ay <= by < gridH):
+            errors.append(f'{code} {[ax, ay, bx, by]} is not inside the {gridW}x{gridH} floor')
+    if errors:
+        return errors
+    (aax, aay, abx, aby), (bax, bay, bbx, bby) = [core[code] for code in CORE_ROOMS]
+    rowsOverlap = aax <= bbx and bax <= abx
+    colsOverlap = aay <= bby and bay <= aby
+    if rowsOverlap and colsOverlap:
+        errors.append(f'{CORE_ROOMS[0]} and {CORE_ROOMS[1]} overlap')
+    elif not ((rowsOverlap and (aby + 1 == bay or bby + 1 == aay)) or
+              (colsOverlap and (abx + 1 == bax or bbx + 1 == aax))):
+        errors.append(f'{CORE_ROOMS[0]} and {CORE_ROOMS[1]} do not touch')
+    return errors
+
+
+# Places the core alone: the elevator and the stairs touch each other, are as small as possible and as close to the
+# middle of the floor as possible, which leaves room to the apartments on every side.
+# Returns the core rects (room code -> rect), None when the core can not be placed
+def solveCore(gridW, gridH, config=None):
+    model = cp_model.CpModel()
+    core = [createRoom(code, 1) for code in CORE_ROOMS]
+    for room in core:
+        roomIntervalConstraint(model, room, gridW, gridH)
+    noOverlapConstraint(model, core, gridW, gridH)
+    model.AddBoolAnd([isTouching(model, core[0], core[1])])
+
+    # distances to the middle in doubled coordinates, so there is no division
+    offsets = []
+    for room in core:
+        for a, b, size in [('ax', 'bx', gridW), ('ay', 'by', gridH)]:
+            offset = model.NewIntVar(0, 2 * size, '')
+            model.AddAbsEquality(offset, room[a] + room[b] - (size - 1))
+            offsets.append(offset)
+    model.Minimize(2 * gridW * gridH * LinearExpr.Sum([room['area'] for room in core]) + LinearExpr.Sum(offsets))
+
+    solver, result = solveModel(model, config)
+    if result["status"] not in ["OPTIMAL", "FEASIBLE"]:
+        return None
+    return {room['val']: getRoomRect(solver.Value, room) for room in core}
+
+
+# Solves one floor program against the core, runs inside a worker process
+def solveFloorProgram(task):
+    spec, core = task["spec"], task["core"]
+    result = {"fingerprint": task["fingerprint"]}
+    try:
+        model = cp_model.CpModel()
+        floor = buildFloor(model, spec, getWindows(core, 0, spec["width"], spec["length"]))
+        # windows outside the domain of a room are dropped, the core is pinned whatever they do
+        for room in floor["corridors"]:
+            if room['val'] in core:
+                for point, value in zip(['ax', 'ay', 'bx', 'by'], core[room['val']]):
+                    model.Add(room[point] == value)
+    except InfeasibleSpecError as e:
+        result["status"] = "REJECTED"
+        result["error"] = str(e)
+        return result
+    solver, solveResult = solveModel(model, getSolverConfig(spec, **task["solver"]))
+    result.update(solveResult)
+    if solveResult["status"] in ["OPTIMAL", "FEASIBLE"]:
+        result["rooms"] = getFloorRects(solver.Value, floor)
+    return result
+
+
+# Solves every floor of the building around a shared core. Returns the core, the result of every floor (in order)
+# and the number of programs that were really solved
+def solveBuilding(building, processes=None, cacheDir=None, solverOverrides=None):
+    floors = building["floors"]
+    gridW, gridH = floors[0]["width"], floors[0]["length"]
+    solverOverrides = solverOverrides or {}
+
+    core = building.get("core")
+    if core is None:
+        core = solveCore(gridW, gridH, dict(getSolverConfig(floors[0], **solverOverrides), preset=None))
+        if core is None:
+            return {"status": "INFEASIBLE", "error": "the core does not fit on the floor"}
+    core = {code: tuple(rect) for code, rect in core.items()}
+    errors = getCoreErrors(core, gridW, gridH)
+    if errors:
+        return {"status": "REJECTED", "error": "; ".join(errors), "core": core}
+
+    # the core is part of the program of a floor
+    programs = {}
+    for spec in floors:
+        program = dict(spec, core=core)
+        programs.setdefault(getSpecFingerprint(program), (spec, program))
+
+    cache = SolutionCache(cacheDir) if cacheDir else None
+    results = {}
+    tasks = []
+    for fingerprint, (spec, program) in programs.items():
+        entry = cache.get(program) if cache else None
+        if entry is not None:
+            results[fingerprint] = {"fingerprint": fingerprint, "status": "CACHED", "objective": entry["objective"],
+                                    "rooms": {code: tuple(rect) for code, rect in entry["rooms"].items()}}
+        else:
+            tasks.append({"fingerprint": fingerprint, "spec": spec, "core": core, "solver": solverOverrides})
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for result in executor.map(solveFloorProgram, tasks):
+            results[result["fingerprint"]] = result
+            if cache and "rooms" in result:
+                cache.store(programs[result["fingerprint"]][1], result["rooms"], result["objective"])
+
+    floorResults = [results[getSpecFingerprint(dict(spec, core=core))] for spec in floors]
+    solved = all("rooms" in result for result in floorResults)
+    return {
+        "status": "FEASIBLE" if solved else "INFEASIBLE",
+        "core": core,
+        "floors": floorResults,
+        "programs": len(programs),
+        "solves": len(tasks),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the floors of a building around a shared vertical core")
+    parser.add_argument("building", help="json building: an optional core and the floor specs")
+    parser.add_argument("--processes", type=int, default=None, help="floor programs solved in parallel")
+    parser.add_argument("--cache", default=None, metavar="DIR", help="reuse the floors solved by previous runs")
+    parser.add_argument("--output", help="json file the layouts are written to")
+    addSolverArguments(parser)
+    args = parser.parse_args()
+
+    result = solveBuilding(loadBuilding(args.building), args.processes, args.cache, getSolverArguments(args))
+    print(f'{result["status"]}, core: {result.get("core")}, '
+          f'{result.get("programs")} floor program(s), {result.get("solves")} solve(s)')
+    if "error" in result:
+        print(result["error"])
+    for level, floor in enumerate(result.get("floors", [])):
+        print(f'floor {level}: {floor["status"]} objective {floor.get("objective")}')
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
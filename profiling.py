@@ -0,0 +1,130 @@
+import functools
+import json
+import sys
+import time
+
+from ortools.sat.python import cp_model
+
+# Opt-in profiling of the model construction: while profiling is enabled, every constraint builder and the boolean
+# helpers of genericUtility are wrapped to record, per function, the calls, the variables and constraints they add to
+# the model and the time they take. total counts everything the function did (the helpers it called included),
+# self only what it did itself.
+#   enableProfiling()
+#   buildFloor(model, spec)
+#   printReport(disableProfiling())
+# The debug output of the builders is only printed while profiling.
+
+# module -> functions wrapped when profiling
+PROFILED_FUNCTIONS = {
+    "genericUtility": ["isAnd", "isOr", "isBetween", "isEqual", "isLessOrEqual", "getSum"],
+    "roomUtility": ["getDistance", "getRoomMid", "isSunRoom", "isAdjacent", "isDiagonal", "isTouching",
+                    "getCellIsValue", "getRoomSpans", "getRoomBorders", "getRoomPerimeter"],
+    "constraints": ["roomConstraint", "createRoomPoints", "roomDimensions", "roomIntervalConstraint",
+                    "noOverlapConstraint", "matchCellToRoom", "enforceComponencyConstraint", "aptAdjacencyConstraint",
+                    "roomAdjacencyConstraint", "intervalRoomAdjacencyConstraint", "intervalAptAdjacencyConstraint",
+                    "getCountSunRooms", "aptOpenAreaConstraint", "ensureGoldenRatio", "getCountDistanceLessThan",
+                    "getCountDistanceGreaterThan", "getPairWiseDistanceBetWeenBedroom",
+                    "getPairWiseDistanceToBathRoom", "sunRoomConstraint", "ensureEqualDistanceToElevator",
+                    "ensureApartmentSymmetry"],
+    "symmetryBreaking": ["breakSymmetries"],
+}
+
+_profile = None
+
+
+# Prints only while profiling, used for the debug output of the builders
+def debugPrint(*args, **kwargs):
+    if _profile is not None:
+        print(*args, **kwargs)
+
+
+def getModelSize(model):
+    proto = model.Proto()
+    return len(proto.variables), len(proto.constraints)
+
+
+def profiled(name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _profile is None:
+            return function(*args, **kwargs)
+        model = next((arg for arg in args if isinstance(arg, cp_model.CpModel)), None)
+        before = getModelSize(model) if model is not None else (0, 0)
+        frame = [0, 0, 0.0]  # variables, constraints and time of the profiled calls made inside this one
+        _profile["stack"].append(frame)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _profile["stack"].pop()
+            after = getModelSize(model) if model is not None else (0, 0)
+            variables, constraints = after[0] - before[0], after[1] - before[1]
+            stats = _profile["functions"].setdefault(name, {"calls": 0, "variables": 0, "constraints": 0,
+                                                            "time": 0.0, "selfVariables": 0,
+                                                            "selfConstraints": 0, "selfTime": 0.0})
+            stats["calls"] += 1
+            stats["variables"] += variables
+            stats["constraints"] += constraints
+            stats["time"] += elapsed
+            stats["selfVariables"] += variables - frame[0]
+            stats["selfConstraints"] += constraints - frame[1]
+            stats["selfTime"] += elapsed - frame[2]
+            if _profile["stack"]:
+                parent = _profile["stack"][-1]
+                parent[0] += variables
+                parent[1] += constraints
+                parent[2] += elapsed
+
+    return wrapper
+
+
+# Wraps the profiled functions in every loaded module that holds them (star imports copy them around)
+def enableProfiling():
+    global _profile
+    if _profile is not None:
+        return
+    # make sure the builders are loaded so their names can be wrapped
+    import constraints
+    import symmetryBreaking
+
+    _profile = {"functions": {}, "stack": [], "patched": []}
+    wrappers = {}
+    for moduleName, names in PROFILED_FUNCTIONS.items():
+        for name in names:
+            function = getattr(sys.modules[moduleName], name)
+            wrappers[function] = profiled(name, function)
+    for module in list(sys.modules.values()):
+        for name, value in list(vars(module).items()) if hasattr(module, "__dict__") else []:
+            try:
+                wrapper = wrappers.get(value)
+            except TypeError:
+                continue
+            if wrapper is not None:
+                setattr(module, name, wrapper)
+                _profile["patched"].append((module, name, value))
+
+
+# Restores the original functions and returns the profile: function name -> stats
+def disableProfiling():
+    global _profile
+    if _profile is None:
+        return {}
+    for module, name, function in _profile["patched"]:
+        setattr(module, name, function)
+    profile = _profile["functions"]
+    _profile = None
+    return profile
+
+
+def printReport(profile, sortBy="selfTime"):
+    print(f'{"function":<36}{"calls":>8}{"vars":>9}{"cons":>9}{"time(s)":>10}{"self vars":>11}{"self cons":>11}'
+          f'{"self(s)":>10}')
+    for name, stats in sorted(profile.items(), key=lambda item: -item[1][sortBy]):
+        print(f'{name:<36}{stats["calls"]:>8}{stats["variables"]:>9}{stats["constraints"]:>9}{stats["time"]:>10.3f}'
+              f'{stats["selfVariables"]:>11}{stats["selfConstraints"]:>11}{stats["selfTime"]:>10.3f}')
+
+
+def saveReport(profile, path):
+    with open(path, "w") as file:
+        json.dump(profile, file, indent=2)
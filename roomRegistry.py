@@ -0,0 +1,94 @@
+from functools import lru_cache
+
+# Typed view of the room codes, so the model is built without parsing strings in the inner loops.
+# A room code is TYPE_APARTMENT[_ASSOCIATION] (e.g. BD_AP1, DR_AP1_a, MNB_AP2_#), corridors and the free space
+# ('D') have no apartment. Codes are parsed once (getRoomInfo) and a Domain keeps the integer code of every value
+# and the lookups the constraints need.
+
+# room type -> the room types it has to be adjacent to
+ADJACENCY_RULES = {"DN": ["K"], "K": ["D"], "MSB": ["D"], "DR": ["BD"], "MNB": ["BD", "D"]}
+
+
+class RoomInfo:
+    """Parsed room code."""
+    __slots__ = ["code", "type", "apt", "assoc", "inApartment", "isSun", "isCorridor"]
+
+    def __init__(self, code):
+        split = code.split("_")
+        self.code = code
+        self.type = split[0]
+        self.apt = split[1] if len(split) > 1 else ""
+        self.assoc = split[2] if len(split) > 2 else None
+        self.inApartment = "AP" in code
+        self.isSun = 'SN_' in code
+        self.isCorridor = "xxx" in code
+
+    def __repr__(self):
+        return f'RoomInfo({self.code!r})'
+
+
+@lru_cache(maxsize=None)
+def getRoomInfo(code):
+    return RoomInfo(code)
+
+
+class Domain(list):
+    """The values a grid cell can take, with an O(1) index and precomputed lookups by room type."""
+
+    def __init__(self, values=()):
+        super().__init__(values)
+        self.__update()
+
+    def __update(self):
+        self.indexOf = {value: idx for idx, value in enumerate(self)}
+        self.infos = [getRoomInfo(value) for value in self]
+        self.corridors = [value for value in self if getRoomInfo(value).isCorridor]
+        self.byType = {}
+        for value in self:
+            self.byType.setdefault(getRoomInfo(value).type, []).append(value)
+        self.__targets = {}
+
+    def append(self, value):
+        super().append(value)
+        self.__update()
+
+    def extend(self, values):
+        super().extend(values)
+        self.__update()
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def index(self, value, *args):
+        if args or value not in self.indexOf:
+            return super().index(value, *args)
+        return self.indexOf[value]
+
+    # Returns, for each room type the room has to be adjacent to, the list of domain values it may touch
+    # (None if the room has no adjacency rule)
+    def getAdjacencyTargets(self, code):
+        if code not in self.__targets:
+            self.__targets[code] = self.__findAdjacencyTargets(getRoomInfo(code))
+        return self.__targets[code]
+
+    def __findAdjacencyTargets(self, info):
+        if info.type not in ADJACENCY_RULES:
+            return None
+        assRoom = ""
+        if info.type in ["MNB", "DR"]:
+            assRoom = info.assoc or ""
+            if info.type == "MNB" and assRoom.startswith("#"):
+                return None
+
+        targets = []
+        for nextElem in ADJACENCY_RULES[info.type]:
+            targets.append([value for value in self.byType.get(nextElem, [])
+                            if (getRoomInfo(value).apt == info.apt or not getRoomInfo(value).inApartment) and
+                            (assRoom == "" or getRoomInfo(value).assoc == assRoom or len(value) == 1)])
+        return targets
+
+
+# Returns domain as a Domain (domain itself when it already is one)
+def asDomain(domain):
+    return domain if isinstance(domain, Domain) else Domain(domain)
@@ -1,31 +1,60 @@
 from genericUtility import *
+from roomRegistry import Domain, asDomain, getRoomInfo
 
 
+# Returns an Int Variable that stores the manhattan distance between the centres of room1 and room2.
+# Midpoints and distances go through the geometry cache of the model, so every pair of rooms is only built once.
+# With doubled coordinates the distance is expressed in half cells (see useDoubledCoordinates)
 def getDistance(model, room1, room2, max):
-    d = model.NewIntVar(0, max, '')
+    cache = getGeometryCache(model)
+    key = tuple(sorted([room1['val'], room2['val']])) + (max,)
+    if key in cache['distance']:
+        cache['hits'] += 1
+        return cache['distance'][key]
+    cache['misses'] += 1
 
-    midXRoom1 = getMid(model, max, room1["ax"], room1["bx"])
-    midYRoom1 = getMid(model, max, room1["ay"], room1["by"])
-    midXRoom2 = getMid(model, max, room2["ax"], room2["bx"])
-    midYRoom2 = getMid(model, max, room2["ay"], room2["by"])
+    scale = cache['scale']
+    d = model.NewIntVar(0, scale * max, '')
 
-    diffX = model.NewIntVar(0, max, '')
-    diffY = model.NewIntVar(0, max, '')
+    midXRoom1 = getRoomMid(model, room1, 'x', max)
+    midYRoom1 = getRoomMid(model, room1, 'y', max)
+    midXRoom2 = getRoomMid(model, room2, 'x', max)
+    midYRoom2 = getRoomMid(model, room2, 'y', max)
+
+    diffX = model.NewIntVar(-scale * max, scale * max, '')
+    diffY = model.NewIntVar(-scale * max, scale * max, '')
 
     model.Add(diffX == midXRoom1 - midXRoom2)
     model.Add(diffY == midYRoom1 - midYRoom2)
 
-    absDiffX = model.NewIntVar(0, max, '')
-    absDiffY = model.NewIntVar(0, max, '')
+    absDiffX = model.NewIntVar(0, scale * max, '')
+    absDiffY = model.NewIntVar(0, scale * max, '')
 
     model.AddAbsEquality(absDiffX, diffX)
     model.AddAbsEquality(absDiffY, diffY)
 
     model.Add(d == absDiffX + absDiffY)
 
+    cache['distance'][key] = d
     return d
 
 
+# Returns the (cached) midpoint of the room along axis ('x' or 'y'), with doubled coordinates this is the
+# linear expression a + b and no division is needed
+def getRoomMid(model, room, axis, max):
+    cache = getGeometryCache(model)
+    key = (room['val'], axis, max)
+    if key in cache['mid']:
+        cache['hits'] += 1
+        return cache['mid'][key]
+    cache['misses'] += 1
+    if cache['scale'] == 2:
+        cache['mid'][key] = room['a' + axis] + room['b' + axis]
+    else:
+        cache['mid'][key] = getMid(model, max, room['a' + axis], room['b' + axis])
+    return cache['mid'][key]
+
+
 def getMid(model, max, pointa, pointb):
     sum = model.NewIntVar(0, max, '')
     mid = model.NewIntVar(0, max, '')
@@ -34,27 +63,50 @@ def getMid(model, max, pointa, pointb):
     return mid
 
 
+# Returns the geometry cache of the model: one midpoint var per room axis and one distance var per unordered
+# pair of rooms, along with the number of cache hits and misses
+def getGeometryCache(model):
+    cache = getModelCache(model, 'geometry')
+    if not cache:
+        cache.update({'mid': {}, 'distance': {}, 'hits': 0, 'misses': 0, 'scale': 1})
+    return cache
+
+
+# Switches the distances of the model to doubled coordinates: room centres are ax + bx and ay + by so distances
+# stay linear, every distance (and every threshold compared to it) is multiplied by getDistanceScale(model)
+def useDoubledCoordinates(model):
+    cache = getGeometryCache(model)
+    if cache['mid'] or cache['distance']:
+        raise ValueError('Doubled coordinates must be selected before any distance is built')
+    cache['scale'] = 2
+
+
+def getDistanceScale(model):
+    return getGeometryCache(model)['scale']
+
+
+def getGeometryStats(model):
+    cache = getGeometryCache(model)
+    return {'midpoints': len(cache['mid']), 'distances': len(cache['distance']),
+            'hits': cache['hits'], 'misses': cache['misses']}
+
+
 def isBedroom(room):
-    split = room["val"].split("_")
-    type = split[0]
-    return type == 'BD'
+    return getRoomInfo(room["val"]).type == 'BD'
 
 
 def isLivingRoom(room):
-    split = room["val"].split("_")
-    type = split[0]
-    return type == 'LR'
+    return getRoomInfo(room["val"]).type == 'LR'
 
 
 def isMainBathroom(room):
-    split = room["val"].split("_")
-    type = split[0]
-    return type == 'MSB'
+    return getRoomInfo(room["val"]).type == 'MSB'
 
 
 # Returns a boolean Variable that specifies whether the distance between roomA and roomB is less than the value
 def isDistanceLessThan(model, roomA, roomB, value, max):
     dist = getDistance(model, roomA, roomB, max)
+    value *= getDistanceScale(model)
     b = model.NewBoolVar('')
     model.Add(dist < value).OnlyEnforceIf(b)
     model.Add(dist >= value).OnlyEnforceIf(b.Not())
@@ -64,6 +116,7 @@ def isDistanceLessThan(model, roomA, roomB, value, max):
 # Returns a boolean Variable that specifies whether the distance between roomA and roomB is greater than the value
 def isDistanceGreaterThan(model, roomA, roomB, value, max):
     dist = getDistance(model, roomA, roomB, max)
+    value *= getDistanceScale(model)
     b = model.NewBoolVar('')
     model.Add(dist > value).OnlyEnforceIf(b)
     model.Add(dist <= value).OnlyEnforceIf(b.Not())
@@ -166,3 +219,69 @@ def between(model, px, py, roomQ):
     model.AddBoolAnd([b1, b2, b3, b4]).OnlyEnforceIf(b)
     model.AddBoolOr([b1.Not(), b2.Not(), b3.Not(), b4.Not()]).OnlyEnforceIf(b.Not())
     return b
+
+
+# Returns a boolean variable that specifies whether roomA and roomB share (part of) a wall
+def isTouching(model, roomA, roomB):
+    rowsOverlap = isAnd(model, [isLessOrEqual(model, roomA['ax'], roomB['bx']),
+                                isLessOrEqual(model, roomB['ax'], roomA['bx'])])
+    colsOverlap = isAnd(model, [isLessOrEqual(model, roomA['ay'], roomB['by']),
+                                isLessOrEqual(model, roomB['ay'], roomA['by'])])
+    verticalWall = isOr(model, [isEqual(model, roomA['by'] + 1, roomB['ay']),
+                                isEqual(model, roomB['by'] + 1, roomA['ay'])])
+    horizontalWall = isOr(model, [isEqual(model, roomA['bx'] + 1, roomB['ax']),
+                                  isEqual(model, roomB['bx'] + 1, roomA['ax'])])
+    return isOr(model, [isAnd(model, [rowsOverlap, verticalWall]), isAnd(model, [colsOverlap, horizontalWall])])
+
+
+# Returns a boolean variable that specifies whether the grid cell holds val (created once per cell and value)
+def getCellIsValue(model, cell, val):
+    cache = getModelCache(model, 'cellIsValue')
+    key = (cell.Index(), val)
+    if key not in cache:
+        cache[key] = isEqual(model, cell, val)
+    return cache[key]
+
+
+# Returns one boolean variable per row and one per column that specify whether the row/column is inside the room.
+# They are created once per room and shared by every cell instead of rebuilding isBetween for each of them
+def getRoomSpans(model, room, gridW, gridH):
+    if 'rowIn' not in room:
+        room['rowIn'] = [isBetween(model, rowIdx, room['ax'], room['bx']) for rowIdx in range(gridW)]
+        room['colIn'] = [isBetween(model, colIdx, room['ay'], room['by']) for colIdx in range(gridH)]
+    return room['rowIn'], room['colIn']
+
+
+# Returns one boolean variable per row (resp. column) that specifies whether the row is right above or below
+# (resp. the column is right to the left or right of) the room
+def getRoomBorders(model, room, gridW, gridH):
+    if 'rowNextTo' not in room:
+        room['rowNextTo'] = [isOr(model, [isEqual(model, rowIdx, room['ax'] - 1), isEqual(model, rowIdx, room['bx'] + 1)])
+                             for rowIdx in range(gridW)]
+        room['colNextTo'] = [isOr(model, [isEqual(model, colIdx, room['ay'] - 1), isEqual(model, colIdx, room['by'] + 1)])
+                             for colIdx in range(gridH)]
+    return room['rowNextTo'], room['colNextTo']
+
+
+# Returns the perimeter index of the room: one boolean variable per cell that specifies whether the cell touches
+# the outer edge of the room. It is built once and shared by every adjacency rule involving the room
+def getRoomPerimeter(model, room, gridW, gridH):
+    if 'perimeter' not in room:
+        rowIn, colIn = getRoomSpans(model, room, gridW, gridH)
+        rowNextTo, colNextTo = getRoomBorders(model, room, gridW, gridH)
+        room['perimeter'] = [[isOr(model, [isAnd(model, [rowNextTo[rowIdx], colIn[colIdx]]),
+                                           isAnd(model, [colNextTo[colIdx], rowIn[rowIdx]])])
+                              for colIdx in range(gridH)]
+                             for rowIdx in range(gridW)]
+    return room['perimeter']
+
+
+# Returns the rectangle (ax, ay, bx, by) of the room in a solution, value is solver.Value (or the callback's)
+def getRoomRect(value, room):
+    return tuple(value(room[point]) for point in ['ax', 'ay', 'bx', 'by'])
+
+
+# Hints the solver to place the room on the rectangle (ax, ay, bx, by)
+def addRoomHint(model, room, rect):
+    for point, pointValue in zip(['ax', 'ay', 'bx', 'by'], rect):
+        model.AddHint(room[point], pointValue)
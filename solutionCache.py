@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# On disk cache of the best layout found for each building spec.
+# Every entry is a json file named after the fingerprint of the spec, holding the spec, the room rectangles and the
+# objective. The modification time of the file is its last use, the least recently used entries are evicted once
+# the cache holds more than maxEntries specs.
+# When a spec is not in the cache, the cached spec sharing the most rooms with it (on the same grid) gives the hints.
+
+DEFAULT_CACHE_DIR = ".layoutCache"
+
+
+# Returns the canonical hash of the parts of the spec that define the layouts (solver settings are left out)
+def getSpecFingerprint(spec):
+    canonical = {key: value for key, value in spec.items() if key != "solver"}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def getRoomCodes(spec):
+    return {room["code"] for apt in spec["apartments"] for room in apt}
+
+
+class SolutionCache:
+    """Persistent cache of the best room rectangles per building spec."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, maxEntries=200):
+        self.__directory = directory
+        self.__maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __path(self, fingerprint):
+        return os.path.join(self.__directory, fingerprint + ".json")
+
+    def __entries(self):
+        return [os.path.join(self.__directory, name) for name in os.listdir(self.__directory) if name.endswith(".json")]
+
+    def __read(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            # the entry was evicted by another process or is half written
+            return None
+
+    # Returns the cached entry of this exact spec (None if there is none)
+    def get(self, spec):
+        path = self.__path(getSpecFingerprint(spec))
+        entry = self.__read(path) if os.path.exists(path) else None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        os.utime(path)
+        return entry
+
+    # Returns the room rectangles (room code -> rect) to hint the solve of the spec with: the ones of the spec itself
+    # when cached, otherwise the matching rooms of the closest cached spec on the same grid
+    def findHints(self, spec):
+        entry = self.get(spec)
+        if entry is not None:
+            return {code: tuple(rect) for code, rect in entry["rooms"].items()}
+
+        codes = getRoomCodes(spec)
+        best, bestPath, bestShared = None, None, 0
+        for path in self.__entries():
+            candidate = self.__read(path)
+            if candidate is None or (candidate["spec"]["width"], candidate["spec"]["length"]) != \
+                    (spec["width"], spec["length"]):
+                continue
+            shared = len(codes & getRoomCodes(candidate["spec"]))
+            if shared > bestShared:
+                best, bestPath, bestShared = candidate, path, shared
+        if best is None:
+            return {}
+        os.utime(bestPath)
+        # corridors are shared by every spec with the same number of apartments
+        corridors = {code for code in best["rooms"] if code not in getRoomCodes(best["spec"])}
+        return {code: tuple(rect) for code, rect in best["rooms"].items() if code in codes or code in corridors}
+
+    # Stores the layout of the spec unless a layout with a better (higher) objective is already cached
+    def store(self, spec, rooms, objective):
+        fingerprint = getSpecFingerprint(spec)
+        path = self.__path(fingerprint)
+        current = self.__read(path) if os.path.exists(path) else None
+        if current is not None and current["objective"] >= objective:
+            os.utime(path)
+            return False
+
+        entry = {"fingerprint": fingerprint, "spec": spec, "rooms": rooms, "objective": objective}
+        handle, tmpPath = tempfile.mkstemp(dir=self.__directory, suffix=".tmp")
+        with os.fdopen(handle, "w") as file:
+            json.dump(entry, file)
+        os.replace(tmpPath, path)
+        self.evict()
+        return True
+
+    # Removes the least recently used entries above maxEntries
+    def evict(self):
+        entries = self.__entries()
+        if len(entries) <= self.__maxEntries:
+            return
+        entries.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for path in entries[:len(entries) - self.__maxEntries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -1,43 +1,53 @@
 from ortools.sat.python import cp_model
 
+from layoutRender import LayoutIndex, LayoutWriter, renderAscii
+
 
 class SolutionPrinterWithLimit(cp_model.CpSolverSolutionCallback):
-    """Print intermediate solutions to out problem."""
+    """Print intermediate solutions to out problem.
+    When output is given the solutions are written to that file as json lines by a background thread instead."""
 
-    def __init__(self, limit, grid, domain, apartments, extra_vars=[]):
+    def __init__(self, limit, grid, domain, apartments, extra_vars=[], output=None):
         cp_model.CpSolverSolutionCallback.__init__(self)
-        self.__grid = grid
         self.__domain = domain
-        self.__apartments = apartments
         self.__solution_count = 0
         self.__solution_limit = limit
         self.__extra_vars = extra_vars
+        self.__index = LayoutIndex(grid, domain, apartments, extra_vars)
+        self.__writer = LayoutWriter(output, self.__index.codes) if output else None
 
     def on_solution_callback(self):
         self.__solution_count += 1
-        self.printSolution()
+        if self.__writer is None:
+            self.printSolution()
+        else:
+            self.__writer.write(self.__index.extractFrom(self), solution=self.__solution_count,
+                                objective=self.ObjectiveValue(), wallTime=self.WallTime())
 
         if self.__solution_count >= self.__solution_limit:
             print('Stop search after %i solutions' % self.__solution_limit)
             self.StopSearch()
 
     def printSolution(self, solver=None):
-        if solver is not None:
-            self.Value = solver.Value
-        for row in self.__grid:
-            for cell in row:
-                print(self.__domain[self.Value(cell)], end=(" " * (10 - len(self.__domain[self.Value(cell)]))))
-            print()
+        layout = self.getLayout(solver)
+        print(renderAscii(layout, self.__domain))
         print()
-        for apt in self.__apartments:
-            for room in apt:
-                print(room['val'])
-                print(
-                    f'a:({self.Value(room["ax"])},{self.Value(room["ay"])}), b:({self.Value(room["bx"])},{self.Value(room["by"])})')
-                print()
-        for var in self.__extra_vars:
-            print(f'{var} {self.Value(var)}')
+        for code, (ax, ay, bx, by) in zip(self.__index.codes, layout["rects"].tolist()):
+            print(code)
+            print(f'a:({ax},{ay}), b:({bx},{by})')
+            print()
+        for var, value in zip(self.__extra_vars, layout["extra"].tolist()):
+            print(f'{var} {value}')
         print('****')
 
+    # Returns the layout (see layoutRender.py) of the current solution, or of the last solution of solver
+    def getLayout(self, solver=None):
+        return self.__index.extractFrom(self if solver is None else solver)
+
+    # Waits for the intermediate solutions to be written
+    def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+
     def solution_count(self):
         return self.__solution_count
@@ -0,0 +1,114 @@
+from ortools.sat.python import cp_model
+
+# Named solver presets tuned for the floor model, the values are CP-SAT parameters
+SOLVER_PRESETS = {
+    # stop on the first layout, feasibility jump and violation ls find rectangle packings quickly
+    "fastFirstLayout": {
+        "num_search_workers": 8,
+        "stop_after_first_solution": True,
+        "use_feasibility_jump": True,
+        "num_violation_ls": 1,
+    },
+    # keep improving the distance / sun room objective until optimality (or the time limit)
+    "bestQuality": {
+        "num_search_workers": 16,
+        "linearization_level": 2,
+        "relative_gap_limit": 0.0,
+    },
+    # the objective does not matter: stop as soon as any layout exists, spend the effort on presolve and
+    # propagation so infeasible specs get proven quickly
+    "proveInfeasible": {
+        "num_search_workers": 8,
+        "stop_after_first_solution": True,
+        "linearization_level": 2,
+        "symmetry_level": 4,
+    },
+}
+
+# Fields of the solver section of a building spec (and of the command line options)
+# {
+#   "preset": "fastFirstLayout",
+#   "workers": 8,                   \\ num_search_workers
+#   "timeLimit": 60,                \\ max_time_in_seconds
+#   "relativeGap": 0.05,            \\ relative_gap_limit
+#   "deterministic": false,         \\ interleaved search with a fixed seed, same result on every run
+#   "seed": 0,
+#   "log": false                    \\ log_search_progress
+# }
+
+
+# Sets the parameters of the solver from a preset and the given overrides (None keeps the preset / default)
+def configureSolver(solver, preset=None, workers=None, timeLimit=None, relativeGap=None, deterministic=False,
+                    seed=None, log=False):
+    if preset is not None:
+        if preset not in SOLVER_PRESETS:
+            raise ValueError(f'Unknown solver preset {preset}, expected one of {list(SOLVER_PRESETS)}')
+        for name, value in SOLVER_PRESETS[preset].items():
+            setattr(solver.parameters, name, value)
+
+    if workers is not None:
+        solver.parameters.num_search_workers = workers
+    if timeLimit is not None:
+        solver.parameters.max_time_in_seconds = timeLimit
+    if relativeGap is not None:
+        solver.parameters.relative_gap_limit = relativeGap
+    if deterministic:
+        solver.parameters.interleave_search = True
+        solver.parameters.random_seed = 0 if seed is None else seed
+    elif seed is not None:
+        solver.parameters.random_seed = seed
+    if log:
+        solver.parameters.log_search_progress = True
+    return solver
+
+
+# Returns the solver config of a spec, overridden by the non None values of overrides
+def getSolverConfig(spec, **overrides):
+    config = dict(spec.get("solver", {}))
+    config.update({key: value for key, value in overrides.items() if value is not None and value is not False})
+    return config
+
+
+# Solves the model with the given config (see configureSolver) and returns the solver and the result:
+# the status, the objective and the solve time breakdown of the solver response
+def solveModel(model, config=None, callback=None):
+    solver = configureSolver(cp_model.CpSolver(), **(config or {}))
+    if callback is None:
+        status = solver.Solve(model)
+    else:
+        status = solver.Solve(model, callback)
+    return solver, getSolveResult(solver, status)
+
+
+def getSolveResult(solver, status):
+    response = solver.ResponseProto()
+    result = {
+        "status": solver.StatusName(status),
+        "wallTime": response.wall_time,
+        "userTime": response.user_time,
+        "deterministicTime": response.deterministic_time,
+        "numBranches": response.num_branches,
+        "numConflicts": response.num_conflicts,
+        "numBooleans": response.num_booleans,
+        "solutionInfo": response.solution_info,
+    }
+    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        result["objective"] = response.objective_value
+        result["bestBound"] = response.best_objective_bound
+    return result
+
+
+# Adds the solver options to an argparse parser
+def addSolverArguments(parser):
+    parser.add_argument("--preset", choices=list(SOLVER_PRESETS), help="named solver preset")
+    parser.add_argument("--workers", type=int, help="number of search workers")
+    parser.add_argument("--time-limit", dest="timeLimit", type=float, help="time limit in seconds")
+    parser.add_argument("--relative-gap", dest="relativeGap", type=float, help="stop at this relative gap")
+    parser.add_argument("--deterministic", action="store_true", help="make repeated solves return the same result")
+    parser.add_argument("--seed", type=int, help="random seed of the search")
+    parser.add_argument("--log", action="store_true", help="print the search log of the solver")
+
+
+def getSolverArguments(args):
+    return {key: getattr(args, key) for key in
+            ["preset", "workers", "timeLimit", "relativeGap", "deterministic", "seed", "log"]}
@@ -0,0 +1,81 @@
+from constraints import getMinimumDimensions
+
+
+class InfeasibleSpecError(ValueError):
+    """Raised when a building spec can be proven impossible before building the model."""
+
+    def __init__(self, reasons):
+        ValueError.__init__(self, "; ".join(reasons))
+        self.reasons = reasons
+
+
+# Returns the reasons why the building spec can not have any layout (an empty list if none was found).
+# Only cheap necessary conditions are checked, so that obviously impossible specs are rejected in milliseconds
+# instead of being built and handed to the solver.
+# relaxed optionally lists optional constraint groups (see generatorLogic.OPTIONAL_GROUPS) that are not checked,
+# for the groups that can be turned off (see layoutSession.py)
+def analyzeSpec(spec, relaxed=()):
+    reasons = []
+    gridW = spec["width"]
+    gridH = spec["length"]
+    if gridW <= 0 or gridH <= 0:
+        return [f'The building must have at least one row and one column, got {gridW}x{gridH}']
+
+    seen = set()
+    totalArea = 0
+    for aptIdx, apt in enumerate(spec["apartments"]):
+        if len(apt) == 0:
+            reasons.append(f'Apartment {aptIdx} has no rooms')
+        for room in apt:
+            code = room["code"]
+            if code in seen:
+                reasons.append(f'Room code {code} is used more than once')
+            seen.add(code)
+
+            tooLarge = []
+            if room["minWidth"] > gridW:
+                tooLarge.append(f'{code} needs a width of {room["minWidth"]} but the building has {gridW} rows')
+            if room["minHeight"] > gridH:
+                tooLarge.append(f'{code} needs a height of {room["minHeight"]} but the building has {gridH} cols')
+            if room["minArea"] > gridW * gridH:
+                tooLarge.append(f'{code} needs an area of {room["minArea"]} but the building has {gridW * gridH} cells')
+            if tooLarge:
+                # the dimension checks below would only repeat these
+                reasons += tooLarge
+                continue
+
+            # spec rooms carry the same minimum fields as the room dicts of constraints.py
+            goldenRatio = room["goldenRatio"] and "goldenRatio" not in relaxed
+            minimums = getMinimumDimensions(dict(room, goldenRatio=goldenRatio), gridW, gridH)
+            if minimums is None:
+                if goldenRatio:
+                    reasons.append(f'{code} can not follow the golden ratio with its minimums on a {gridW}x{gridH} grid')
+                else:
+                    reasons.append(f'{code} can not reach an area of {room["minArea"]} on a {gridW}x{gridH} grid')
+            else:
+                totalArea += minimums[2]
+
+    # every apartment gets a corridor, plus the elevator and the stairs, all of them at least one cell
+    corridorArea = len(spec["apartments"]) + 2
+    if totalArea + corridorArea > gridW * gridH:
+        reasons.append(f'The rooms and corridors need at least {totalArea + corridorArea} cells '
+                       f'but the building has {gridW * gridH}')
+
+    if spec["symmetricApartments"] and "symmetry" not in relaxed:
+        for first, second in spec["sameTypePairs"]:
+            if len(spec["apartments"][first]) != len(spec["apartments"][second]):
+                reasons.append(f'Apartments {first} and {second} should be symmetric but have a different '
+                               f'number of rooms')
+
+    if spec["allApartmentsOnOpenArea"] and "openArea" not in relaxed and not any(spec["openWalls"].values()):
+        reasons.append('All apartments should be on an open area but no wall is open')
+
+    return reasons
+
+
+# Raises InfeasibleSpecError if the building spec can be proven impossible
+def checkSpec(spec, relaxed=()):
+    reasons = analyzeSpec(spec, relaxed)
+    if reasons:
+        raise InfeasibleSpecError(reasons)
+
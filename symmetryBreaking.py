@@ -0,0 +1,105 @@
+from ortools.sat.python.cp_model import LinearExpr
+
+from roomRegistry import getRoomInfo
+
+# Symmetry breaking for interchangeable apartments and rooms.
+# Two rooms of an apartment are interchangeable when swapping their rectangles gives another layout with the same
+# objective: same type and minimums, no association (DR_/MNB_ rooms and the rooms they point to) and no distance rule.
+# Two apartments are interchangeable when all their rooms match one by one (ignoring the apartment part of the codes)
+# and they have the same distance rules.
+# Interchangeable entities are ordered by the position of their rooms, so the solver only explores one permutation.
+
+
+# Returns the room code without its apartment part, e.g. BD_AP2_a -> BD__a
+def getNormalizedCode(room):
+    info = getRoomInfo(room['val'])
+    if not info.apt:
+        return info.code
+    return f'{info.type}_' + ("" if info.assoc is None else f'_{info.assoc}')
+
+
+def getRoomSignature(room):
+    info = getRoomInfo(room['val'])
+    return (info.type, info.isSun, room['minArea'], room['minHeight'],
+            room['minWidth'], room.get('goldenRatio', False))
+
+
+# Returns the indices of the rooms of the apartment that can be swapped with another room
+def getSwappableRooms(apt, ruleRooms):
+    associations = set()
+    for room in apt:
+        info = getRoomInfo(room['val'])
+        if info.type in ["DR", "MNB"] and info.assoc is not None:
+            associations.add(info.assoc)
+
+    swappable = []
+    for roomIdx, room in enumerate(apt):
+        info = getRoomInfo(room['val'])
+        if info.type in ["DR", "MNB"] or roomIdx in ruleRooms:
+            continue
+        if info.assoc is not None and info.assoc in associations:
+            continue
+        swappable.append(roomIdx)
+    return swappable
+
+
+# Returns the key used to order the rooms: top left cell of the room in row major order
+def getRoomKey(room, gridH):
+    return room['ax'] * gridH + room['ay']
+
+
+# Adds lexicographic ordering constraints between interchangeable apartments and rooms.
+# distanceRules is the list of (apartment, room, room, kind, distance) of the floor.
+# When mirrored is set (ensureApartmentSymmetry is applied to sameTypePairs) the ordering only uses the
+# permutations that keep the mirror constraints valid
+def breakSymmetries(model, apartments, gridH, sameTypePairs=[], mirrored=False, distanceRules=[]):
+    n = len(apartments)
+    aptRules = [sorted((a, b, kind, d) for apt, a, b, kind, d in distanceRules if apt == aptIdx) for aptIdx in range(n)]
+    aptSignatures = [(tuple(getNormalizedCode(room) for room in apt), tuple(getRoomSignature(room) for room in apt),
+                      tuple(aptRules[aptIdx])) for aptIdx, apt in enumerate(apartments)]
+
+    # components of apartments tied together by the mirror constraints
+    component = list(range(n))
+    if mirrored:
+        for first, second in sameTypePairs:
+            old, new = component[second], component[first]
+            component = [new if c == old else c for c in component]
+    members = {}
+    for aptIdx in range(n):
+        members.setdefault(component[aptIdx], []).append(aptIdx)
+
+    # apartments: free apartments are ordered inside their signature group, mirrored ones only inside their pair
+    groups = {}
+    for aptIdx in range(n):
+        if len(members[component[aptIdx]]) == 1:
+            groups.setdefault(aptSignatures[aptIdx], []).append(aptIdx)
+    orderedPairs = []
+    for group in groups.values():
+        orderedPairs += zip(group, group[1:])
+    for aptIdxs in members.values():
+        if len(aptIdxs) == 2 and aptSignatures[aptIdxs[0]] == aptSignatures[aptIdxs[1]]:
+            orderedPairs.append(tuple(aptIdxs))
+    for first, second in orderedPairs:
+        # the key does not depend on the order of the rooms, so it does not conflict with the room ordering
+        model.Add(LinearExpr.Sum([getRoomKey(room, gridH) for room in apartments[first]]) <=
+                  LinearExpr.Sum([getRoomKey(room, gridH) for room in apartments[second]]))
+
+    # rooms: a permutation of rooms has to be applied to every apartment of a mirror component at once,
+    # so rooms are only ordered in the first apartment of the component
+    for aptIdxs in members.values():
+        apt = apartments[aptIdxs[0]]
+        ruleRooms = set()
+        for aptIdx in aptIdxs:
+            for a, b, kind, d in aptRules[aptIdx]:
+                ruleRooms.update([a, b])
+        swappable = set(getSwappableRooms(apt, ruleRooms))
+        for aptIdx in aptIdxs[1:]:
+            swappable &= set(getSwappableRooms(apartments[aptIdx], ruleRooms))
+
+        roomGroups = {}
+        for roomIdx in sorted(swappable):
+            signature = tuple(getRoomSignature(apartments[aptIdx][roomIdx]) for aptIdx in aptIdxs)
+            roomGroups.setdefault(signature, []).append(roomIdx)
+        for group in roomGroups.values():
+            for first, second in zip(group, group[1:]):
+                model.Add(getRoomKey(apt[first], gridH) < getRoomKey(apt[second], gridH))